@@ -0,0 +1,132 @@
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
+
+from . import images, models
+
+def pending_users():
+    return models.User.objects.filter(
+        avatar_pending=True,
+    ).exclude(
+        avatar='',
+    ).exclude(
+        avatar__isnull=True,
+    ).order_by('pk')
+
+def pending_thumbnail_users():
+    '''
+    Users with a processed avatar but no thumbnails, because its crop has
+    changed since they were generated.
+    '''
+    return models.User.objects.filter(
+        avatar_pending=False,
+        avatar_thumbnail_stem='',
+    ).exclude(
+        avatar='',
+    ).exclude(
+        avatar__isnull=True,
+    ).order_by('pk')
+
+def reject(user):
+    '''
+    Drops an avatar which could not be processed, unless it has been changed
+    since the user was loaded.
+    '''
+    raw_name = user.avatar.name
+
+    rejected = models.User.objects.filter(
+        pk=user.pk,
+        avatar=raw_name,
+    ).update(
+        avatar='',
+        avatar_pending=False,
+    )
+
+    if rejected:
+        user.avatar.storage.delete(raw_name)
+
+def process(users, processes=None, *, executor=None):
+    '''
+    Decodes and resizes the users' avatars in a pool of `processes` worker
+    processes (one per CPU by default), and stores the results from this
+    process. Returns how many avatars were processed and how many had to be
+    rejected.
+
+    `executor` is a concurrent.futures executor to use instead of starting
+    a pool, e.g. a ThreadPoolExecutor in tests, which may run in daemonic
+    processes that can't start their own. The caller shuts it down.
+    '''
+    processed_count = 0
+    rejected_count = 0
+    uploads = []
+
+    for user in users:
+        try:
+            with user.avatar.open('rb') as avatar_file:
+                uploads.append((user, avatar_file.read()))
+        except OSError:
+            reject(user)
+            rejected_count += 1
+
+    if not uploads:
+        return processed_count, rejected_count
+
+    if executor is None:
+        running_pool = ProcessPoolExecutor(max_workers=processes)
+    else:
+        running_pool = contextlib.nullcontext(executor)
+
+    with running_pool as pool:
+        futures = [
+            (user, pool.submit(images.process_image, upload))
+            for user, upload in uploads
+        ]
+
+        for user, future in futures:
+            try:
+                processed = future.result()
+            except Exception:
+                reject(user)
+                rejected_count += 1
+                continue
+
+            if user.process_avatar(processed):
+                processed_count += 1
+
+    return processed_count, rejected_count
+
+def regenerate_thumbnails(users):
+    '''
+    Generates thumbnails for the users' processed avatars with their current
+    crop. Returns how many were generated and how many avatars had to be
+    rejected.
+    '''
+    generated_count = 0
+    rejected_count = 0
+
+    for user in users:
+        try:
+            generated = user.generate_avatar_thumbnails()
+        except Exception:
+            reject(user)
+            rejected_count += 1
+            continue
+
+        if generated:
+            generated_count += 1
+
+    return generated_count, rejected_count
+
+def run_pending(batch_size=20, processes=None, *, executor=None):
+    processed_count, rejected_count = process(
+        pending_users()[:batch_size],
+        processes,
+        executor=executor,
+    )
+    generated_count, thumbnails_rejected_count = regenerate_thumbnails(
+        pending_thumbnail_users()[:batch_size],
+    )
+
+    return (
+        processed_count + generated_count,
+        rejected_count + thumbnails_rejected_count,
+    )
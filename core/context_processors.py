@@ -1,4 +1,8 @@
 from django.conf import settings
+from django.db.models import F, Func, IntegerField, Subquery
+from django.utils.functional import SimpleLazyObject, cached_property
+
+from . import models, stylesheets
 
 class SettingsForTemplates(object):
     def __init__(self):
@@ -15,3 +19,74 @@ def settings_for_templates(request):
     return {
         'settings': SettingsForTemplates(),
     }
+
+
+def count_of(queryset):
+    return Subquery(
+        queryset.order_by().annotate(
+            count=Func(
+                F('pk'),
+                function='COUNT',
+                output_field=IntegerField(),
+            ),
+        ).values('count'),
+    )
+
+class Navigation(object):
+    '''
+    The data base.html needs for the header. Each group is computed the
+    first time a template asks for it, then reused for the rest of the
+    request.
+    '''
+    def __init__(self, user):
+        self.user = user
+
+    @cached_property
+    def circles(self):
+        return list(self.user.circles.all())
+
+    @cached_property
+    def _counts(self):
+        # One query for every count in the header
+        return models.User.objects.filter(pk=self.user.pk).values(
+            open_intro_count=count_of(self.user.open_intros),
+            unread_message_count=Subquery(
+                self.user.connections.order_by().annotate(
+                    total=Func(
+                        F('unread_count'),
+                        function='SUM',
+                        output_field=IntegerField(),
+                    ),
+                ).values('total'),
+            ),
+        ).get()
+
+    @property
+    def connection_count(self):
+        return self.user.connection_count
+
+    @property
+    def open_intro_count(self):
+        return self._counts['open_intro_count']
+
+    @property
+    def unread_message_count(self):
+        return self._counts['unread_message_count'] or 0
+
+def navigation(request):
+    if not request.user.is_authenticated:
+        return {}
+
+    if not hasattr(request, '_navigation'):
+        request._navigation = Navigation(request.user)
+
+    return {
+        'navigation': request._navigation,
+    }
+
+def stylesheet(request):
+    return {
+        'stylesheet': SimpleLazyObject(
+            lambda: stylesheets.stylesheet_for(request.user),
+        ),
+    }
@@ -0,0 +1,121 @@
+from datetime import timedelta
+import traceback
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import models
+
+MAX_ATTEMPTS = 5
+
+def retry_delay(attempts):
+    return timedelta(seconds=2 ** attempts)
+
+def runnable_jobs(model=models.FanoutJob):
+    return model.objects.filter(
+        attempts__lt=MAX_ATTEMPTS,
+        run_after__lte=timezone.now(),
+    ).order_by('created_utc')
+
+def run_job(job_pk):
+    '''
+    Runs one FanoutJob, returning True if it was run and False if another
+    worker got to it first or it failed.
+    '''
+    try:
+        with transaction.atomic():
+            job = models.FanoutJob.objects.select_for_update(
+                skip_locked=True,
+            ).select_related(
+                'post_circle__post',
+            ).filter(pk=job_pk).first()
+
+            if job is None:
+                return False
+
+            job.post_circle.post.link_to_readers([job.post_circle])
+            job.delete()
+
+    except Exception:
+        record_failure(models.FanoutJob.objects.filter(pk=job_pk))
+        return False
+
+    return True
+
+def run_backfill_job(job_pk):
+    '''
+    Runs one batch of a BackfillJob, returning True if it was run and False
+    if another worker got to it first or it failed. The job is deleted once
+    it is finished, and otherwise goes back in the queue.
+    '''
+    try:
+        with transaction.atomic():
+            job = models.BackfillJob.objects.select_for_update(
+                skip_locked=True,
+            ).select_related(
+                'circle_membership__connection',
+            ).filter(pk=job_pk).first()
+
+            if job is None:
+                return False
+
+            if job.run_batch():
+                job.delete()
+            else:
+                job.save(update_fields=('remaining', 'cursor'))
+
+    except Exception:
+        record_failure(models.BackfillJob.objects.filter(pk=job_pk))
+        return False
+
+    return True
+
+def record_failure(failed_jobs):
+    attempts = failed_jobs.values_list('attempts', flat=True).first()
+
+    if attempts is not None:
+        failed_jobs.update(
+            attempts=attempts + 1,
+            run_after=timezone.now() + retry_delay(attempts + 1),
+            last_error=traceback.format_exc(),
+        )
+
+def run_pending(batch_size=100):
+    '''
+    Runs up to `batch_size` jobs of each kind which are due, returning how
+    many were run.
+    '''
+    job_pks = list(
+        runnable_jobs().values_list('pk', flat=True)[:batch_size],
+    )
+    backfill_job_pks = list(
+        runnable_jobs(models.BackfillJob).values_list(
+            'pk',
+            flat=True,
+        )[:batch_size],
+    )
+    ran = sum(run_job(job_pk) for job_pk in job_pks)
+    ran += sum(run_backfill_job(job_pk) for job_pk in backfill_job_pks)
+    return ran
+
+def any_runnable_jobs():
+    return any(
+        runnable_jobs(model).exists()
+        for model in (models.FanoutJob, models.BackfillJob)
+    )
+
+def drain():
+    '''
+    Runs jobs until none are due. Tests use this to deliver deferred posts
+    synchronously.
+    '''
+    total = 0
+
+    while any_runnable_jobs():
+        ran = run_pending()
+        total += ran
+
+        if ran == 0:
+            break
+
+    return total
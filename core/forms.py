@@ -23,10 +23,18 @@ class CircleMultipleChoiceField(forms.ModelMultipleChoiceField):
 class CircleForm(forms.ModelForm):
     class Meta:
         model = models.Circle
-        fields = ('name', 'color')
+        fields = ('name', 'color', 'backfill_post_count')
+        labels = {
+            'backfill_post_count': 'Posts shown to new members',
+        }
         help_texts = {
             'name': 'This will not be shown to other users.',
             'color': f"The color of the circle's icon. { COLOR_HELP_TEXT }",
+            'backfill_post_count': (
+                'How many of your most recent posts to this circle someone '
+                'you add to it can see. With 0, they only see posts you make '
+                'after adding them.'
+            ),
         }
 
 class MessageForm(forms.ModelForm):
@@ -138,12 +146,83 @@ class PostForm(forms.ModelForm):
 
 
 class ProfileForm(forms.ModelForm):
+    CROP_FIELDS = (
+        'avatar_crop_x0',
+        'avatar_crop_x1',
+        'avatar_crop_y0',
+        'avatar_crop_y1',
+    )
+
     name = forms.CharField(required=False)
     avatar = forms.ImageField(required=False)
 
     class Meta:
         model = get_user_model()
-        fields = ('name', 'avatar')
+        fields = (
+            'name',
+            'avatar',
+            'avatar_crop_x0',
+            'avatar_crop_x1',
+            'avatar_crop_y0',
+            'avatar_crop_y1',
+        )
+        labels = {
+            'avatar_crop_x0': 'Crop left',
+            'avatar_crop_x1': 'Crop right',
+            'avatar_crop_y0': 'Crop top',
+            'avatar_crop_y1': 'Crop bottom',
+        }
+        help_texts = {
+            'avatar_crop_x0':
+                'The square of the avatar to show, in pixels from its top '
+                'left corner. Leave these blank to show the middle of it.',
+        }
+
+    def clean(self):
+        cleaned_data = super().clean()
+
+        # A new avatar starts out with the default crop
+        if 'avatar' in self.changed_data:
+            for field in self.CROP_FIELDS:
+                cleaned_data[field] = None
+
+            return cleaned_data
+
+        crop = [cleaned_data.get(field) for field in self.CROP_FIELDS]
+
+        if all(value is None for value in crop):
+            return cleaned_data
+
+        if any(value is None for value in crop):
+            raise ValidationError('Set all of the crop values, or none.')
+
+        if not self.instance.avatar:
+            raise ValidationError('Upload an avatar before cropping it.')
+
+        if self.instance.avatar_pending:
+            raise ValidationError(
+                'Your avatar can be cropped once it has been processed.',
+            )
+
+        x0, x1, y0, y1 = crop
+
+        if x0 >= x1 or y0 >= y1:
+            raise ValidationError(
+                'The crop must end to the right of and below where it starts.',
+            )
+
+        if x1 > self.instance.avatar_width or y1 > self.instance.avatar_height:
+            raise ValidationError(
+                'The crop must fit within your avatar, which is {}x{}.'.format(
+                    self.instance.avatar_width,
+                    self.instance.avatar_height,
+                ),
+            )
+
+        if x1 - x0 != y1 - y0:
+            raise ValidationError('The crop must be square.')
+
+        return cleaned_data
 
 class SettingsForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,73 @@
+'''
+A cache of each user's neighbors in the connection graph, i.e. the pks of the
+users they are connected with, for work like intro suggestions which reads
+the neighbors of many users. Access checks must not use it: they query
+Connection directly, see `User.is_connected_with`.
+
+Entries are invalidated whenever a Connection is saved or deleted (see the
+receivers in models.py). The cache is `settings.CONNECTION_CACHE`, which is
+local to each process unless a shared cache is configured, so entries also
+expire after `settings.CONNECTION_CACHE_TIMEOUT` seconds to bound how long
+another process can see a stale graph.
+'''
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+def get_cache():
+    return caches[settings.CONNECTION_CACHE]
+
+def cache_key(user_pk):
+    return 'core.graph.neighbors:{}'.format(user_pk)
+
+def load_neighbors(user_pks):
+    Connection = apps.get_model('core', 'Connection')
+    result = {user_pk: set() for user_pk in user_pks}
+
+    for owner_pk, other_user_pk in Connection.objects.filter(
+        owner__in=user_pks,
+    ).values_list('owner', 'other_user'):
+        result[owner_pk].add(other_user_pk)
+
+    return {
+        user_pk: frozenset(neighbors)
+        for user_pk, neighbors in result.items()
+    }
+
+def neighbors_of_many(user_pks):
+    '''
+    Returns a dictionary of each user's neighbors, as a frozenset of pks,
+    keyed by user pk. Users which are not cached are loaded in one query.
+    '''
+    cache = get_cache()
+    keys = {cache_key(user_pk): user_pk for user_pk in user_pks}
+    cached = cache.get_many(keys)
+    result = {keys[key]: neighbors for key, neighbors in cached.items()}
+
+    missing = [
+        user_pk
+        for key, user_pk in keys.items()
+        if key not in cached
+    ]
+
+    if missing:
+        loaded = load_neighbors(missing)
+        cache.set_many(
+            {cache_key(user_pk): value for user_pk, value in loaded.items()},
+            settings.CONNECTION_CACHE_TIMEOUT,
+        )
+        result.update(loaded)
+
+    return result
+
+def neighbors(user_pk):
+    return neighbors_of_many([user_pk])[user_pk]
+
+def invalidate(*user_pks):
+    keys = [cache_key(user_pk) for user_pk in user_pks]
+    get_cache().delete_many(keys)
+
+    # Another request could cache the graph as it was before this
+    # transaction, so invalidate again once the change is visible to it.
+    transaction.on_commit(lambda: get_cache().delete_many(keys))
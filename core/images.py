@@ -1,4 +1,14 @@
 from collections import namedtuple
+import functools
+import hashlib
+import io
+import os
+
+from PIL import Image, ImageOps, features
+
+# Square avatar sizes, in pixels. 80 and 160 cover the 5rem avatars in feeds
+# at 1x and 2x, and 320 covers the 20rem avatar on profiles.
+THUMBNAIL_SIZES = (80, 160, 320)
 
 _ImageCrop = namedtuple(
     'ImageCrop',
@@ -52,3 +62,211 @@ class ImageCrop(_ImageCrop):
     @property
     def show_height(self):
         return 100 * self.crop_height / self.image_height
+
+CropStyle = namedtuple('CropStyle', ('apply', 'show'))
+
+@functools.lru_cache(maxsize=4096)
+def crop_style(crop):
+    '''
+    Renders the inline CSS which crops an image with `crop`: `apply` positions
+    the image inside a box showing only the crop, and `show` outlines the
+    crop on top of the whole image. Returns None if the crop is empty.
+
+    This is cached by crop, which includes the image size, so every avatar
+    with the same dimensions and crop shares one result.
+    '''
+    if crop.crop_width <= 0 or crop.crop_height <= 0:
+        return None
+
+    return CropStyle(
+        apply='left: {}%; top: {}%; width: {}%; height: {}%;'.format(
+            crop.apply_left,
+            crop.apply_top,
+            crop.apply_width,
+            crop.apply_height,
+        ),
+        show='left: {}%; top: {}%; width: {}%; height: {}%;'.format(
+            crop.show_left,
+            crop.show_top,
+            crop.show_width,
+            crop.show_height,
+        ),
+    )
+
+def crop_styles(crops):
+    '''
+    Renders the styles for many crops at once, e.g. for every avatar on a
+    page, returning a dictionary keyed by crop. Each distinct crop is only
+    computed once.
+    '''
+    return {crop: crop_style(crop) for crop in set(crops)}
+
+
+# Formats processed avatars are re-encoded in; anything else becomes a PNG.
+PROCESSED_FORMATS = {
+    'GIF': 'gif',
+    'JPEG': 'jpg',
+    'PNG': 'png',
+    'WEBP': 'webp',
+}
+
+# Modes whose colors are RGB, so an embedded ICC profile stays valid
+RGB_MODES = ('RGB', 'RGBA', 'RGBX', 'P', 'PA')
+
+def has_alpha(image):
+    if image.mode in ('RGBA', 'LA', 'PA'):
+        return True
+
+    return 'transparency' in image.info
+
+def output_mode(image, image_format):
+    '''
+    RGBA for images with transparency, unless the format is JPEG, which
+    can't store it; otherwise RGB.
+    '''
+    if has_alpha(image) and image_format != 'JPEG':
+        return 'RGBA'
+
+    return 'RGB'
+
+ProcessedImage = namedtuple(
+    'ProcessedImage',
+    (
+        'data',
+        'extension',
+        'crop',
+        'thumbnails',
+        'thumbnail_extension',
+    ),
+)
+
+def centered_crop(width, height):
+    '''
+    The largest square in the middle of a width x height image.
+    '''
+    x0 = 0
+    x1 = width
+    y0 = 0
+    y1 = height
+
+    if height > width:
+        y0 = (height - width) // 2
+        y1 = (height + width) // 2
+
+    elif width > height:
+        x0 = (width - height) // 2
+        x1 = (width + height) // 2
+
+    return ImageCrop(
+        image_width=width,
+        image_height=height,
+        x0=x0,
+        x1=x1,
+        y0=y0,
+        y1=y1,
+    )
+
+def thumbnail_format():
+    if features.check('webp'):
+        return 'WEBP', 'webp'
+
+    return 'JPEG', 'jpg'
+
+def thumbnail_key(image_data, crop):
+    '''
+    Identifies a set of thumbnails by the image they were made from and the
+    crop applied to it, so thumbnails are only regenerated when one changes.
+    '''
+    digest = hashlib.sha256(image_data)
+    digest.update(repr(tuple(crop)).encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+def thumbnail_stem(image_name, key, extension):
+    '''
+    Thumbnails are stored next to the original, e.g. `cat.jpg` gets
+    `cat.<key>.80.webp`. This returns the name shared by every size,
+    `cat.<key>.webp`, which keeps the format the thumbnails were made in.
+    '''
+    stem, _ = os.path.splitext(image_name)
+    return '{}.{}.{}'.format(stem, key, extension)
+
+def thumbnail_name(stem, size):
+    stem, extension = os.path.splitext(stem)
+    return '{}.{}{}'.format(stem, size, extension)
+
+def make_thumbnails(image, crop, sizes=THUMBNAIL_SIZES):
+    '''
+    Crops a PIL image to `crop` and returns a dictionary of encoded square
+    thumbnails, keyed by size.
+    '''
+    image_format, _ = thumbnail_format()
+
+    if has_alpha(image):
+        image = image.convert('RGBA')
+
+        if image_format == 'JPEG':
+            # Transparent areas would otherwise turn black
+            background = Image.new('RGBA', image.size, 'white')
+            image = Image.alpha_composite(background, image)
+
+    image = image.convert(output_mode(image, image_format))
+    cropped = image.crop((crop.x0, crop.y0, crop.x1, crop.y1))
+
+    result = {}
+
+    for size in sizes:
+        thumbnail = cropped.resize((size, size), Image.LANCZOS)
+        buffer = io.BytesIO()
+        thumbnail.save(buffer, format=image_format, quality=85)
+        result[size] = buffer.getvalue()
+
+    return result
+
+def make_thumbnails_from_data(image_data, crop, sizes=THUMBNAIL_SIZES):
+    with Image.open(io.BytesIO(image_data)) as image:
+        return make_thumbnails(image, crop, sizes)
+
+def process_image(image_data, sizes=THUMBNAIL_SIZES):
+    '''
+    Decodes an uploaded image, rotates it upright according to its EXIF
+    orientation, and re-encodes it without the EXIF data (which can include
+    the location a photo was taken). Returns the re-encoded image along with
+    thumbnails of its centered square crop.
+
+    This only takes and returns plain data, so it can be run in a process
+    pool.
+    '''
+    with Image.open(io.BytesIO(image_data)) as original:
+        image_format = original.format
+        icc_profile = original.info.get('icc_profile')
+        image = ImageOps.exif_transpose(original)
+
+    if image_format not in PROCESSED_FORMATS:
+        image_format = 'PNG'
+
+    save_options = {}
+
+    # An ICC profile only describes the converted image if it was already
+    # RGB, e.g. not for a CMYK image
+    if icc_profile and image.mode in RGB_MODES:
+        save_options['icc_profile'] = icc_profile
+
+    # Uploads can be in modes, like CMYK, which the output format can't store
+    image = image.convert(output_mode(image, image_format))
+
+    if image_format == 'JPEG':
+        save_options['quality'] = 90
+
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format, **save_options)
+
+    crop = centered_crop(*image.size)
+    _, thumbnail_extension = thumbnail_format()
+
+    return ProcessedImage(
+        data=buffer.getvalue(),
+        extension=PROCESSED_FORMATS[image_format],
+        crop=crop,
+        thumbnails=make_thumbnails(image, crop, sizes),
+        thumbnail_extension=thumbnail_extension,
+    )
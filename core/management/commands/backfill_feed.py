@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core import models
+
+class Command(BaseCommand):
+    help = 'Creates FeedEntries for posts published before feeds existed.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='How many FeedEntries to insert per statement.',
+        )
+
+    def handle(self, *args, batch_size, **options):
+        own_posts = models.Post.objects.values_list(
+            'owner',
+            'pk',
+            'created_utc',
+        )
+        shared_posts = models.PostUser.objects.values_list(
+            'circle_membership__connection__other_user',
+            'post_circle__post',
+            'post_circle__post__created_utc',
+        ).distinct()
+
+        total = 0
+
+        for rows in (own_posts, shared_posts):
+            batch = []
+
+            for reader_pk, post_pk, created_utc in rows.iterator(
+                chunk_size=batch_size,
+            ):
+                batch.append(models.FeedEntry(
+                    reader_id=reader_pk,
+                    post_id=post_pk,
+                    created_utc=created_utc,
+                ))
+
+                if len(batch) >= batch_size:
+                    total += self.write(batch)
+                    batch = []
+
+            total += self.write(batch)
+
+        self.stdout.write(f'Checked {total} feed entries.')
+
+    @transaction.atomic
+    def write(self, batch):
+        models.FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+        return len(batch)
@@ -0,0 +1,54 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core import avatars
+
+class Command(BaseCommand):
+    help = 'Processes uploaded avatars and generates their thumbnails.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=20,
+            help='How many avatars to process at a time.',
+        )
+        parser.add_argument(
+            '--processes',
+            type=int,
+            default=None,
+            help='How many worker processes to use; defaults to one per CPU.',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=1.0,
+            help='Seconds to wait when there are no avatars to process.',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Process the avatars which are waiting and exit.',
+        )
+
+    def handle(
+        self,
+        *args,
+        batch_size,
+        processes,
+        poll_interval,
+        once,
+        **options,
+    ):
+        while True:
+            processed, rejected = avatars.run_pending(batch_size, processes)
+
+            if processed or rejected:
+                self.stdout.write(
+                    f'Processed {processed} avatars, rejected {rejected}.',
+                )
+            elif once:
+                return
+            else:
+                time.sleep(poll_interval)
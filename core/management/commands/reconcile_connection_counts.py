@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from core import models
+
+def count_connections():
+    return Coalesce(
+        Subquery(
+            models.Connection.objects.filter(
+                owner=OuterRef('pk'),
+            ).order_by().values('owner').annotate(
+                count=Count('pk'),
+            ).values('count'),
+        ),
+        0,
+    )
+
+class Command(BaseCommand):
+    help = (
+        'Recounts User.connection_count from the Connection table, and '
+        'repairs any that have drifted.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report drifted users without repairing them.',
+        )
+
+    def handle(self, *args, dry_run, **options):
+        drifted_pks = list(models.User.objects.annotate(
+            expected_connection_count=count_connections(),
+        ).exclude(
+            connection_count=F('expected_connection_count'),
+        ).values_list('pk', flat=True))
+
+        if not dry_run:
+            # Recount in the UPDATE itself, so connections made since the
+            # SELECT above are not lost
+            models.User.objects.filter(pk__in=drifted_pks).update(
+                connection_count=count_connections(),
+            )
+
+        verb = 'Found' if dry_run else 'Repaired'
+        self.stdout.write(f'{verb} {len(drifted_pks)} drifted users.')
@@ -0,0 +1,67 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from core import models
+
+def count_messages(**filters):
+    return Coalesce(
+        Subquery(
+            models.Message.objects.filter(**filters).order_by().values(
+                'connection',
+            ).annotate(
+                count=Count('pk'),
+            ).values('count'),
+        ),
+        0,
+    )
+
+class Command(BaseCommand):
+    help = (
+        'Recounts Connection.message_count and Connection.unread_count '
+        'from the Message table, and repairs any that have drifted. Also '
+        'recomputes Connection.last_message.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report drifted connections without repairing them.',
+        )
+
+    def handle(self, *args, dry_run, **options):
+        outgoing = count_messages(connection=OuterRef('pk'))
+        incoming = count_messages(connection=OuterRef('opposite'))
+        unread = count_messages(connection=OuterRef('opposite'), is_read=False)
+
+        message_count_drifted = ~Q(message_count=F('expected_message_count'))
+        unread_count_drifted = ~Q(unread_count=F('expected_unread_count'))
+
+        drifted_pks = list(models.Connection.objects.annotate(
+            expected_message_count=outgoing + incoming,
+            expected_unread_count=unread,
+        ).filter(
+            message_count_drifted | unread_count_drifted,
+        ).values_list('pk', flat=True))
+
+        if not dry_run:
+            # Recount in the UPDATE itself, so messages sent since the
+            # SELECT above are not lost
+            models.Connection.objects.filter(pk__in=drifted_pks).update(
+                message_count=outgoing + incoming,
+                unread_count=unread,
+            )
+
+            sent = Q(connection=OuterRef('pk'))
+            received = Q(connection=OuterRef('opposite'))
+            models.Connection.objects.update(
+                last_message=Subquery(
+                    models.Message.objects.filter(
+                        sent | received,
+                    ).order_by('-created_utc').values('pk')[:1],
+                ),
+            )
+
+        verb = 'Found' if dry_run else 'Repaired'
+        self.stdout.write(f'{verb} {len(drifted_pks)} drifted connections.')
@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core import fanout
+
+class Command(BaseCommand):
+    help = (
+        'Delivers published posts to the feeds of circle members, and '
+        "recent posts to new members' feeds."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='How many jobs to claim at a time.',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=1.0,
+            help='Seconds to wait when there are no jobs.',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Run the jobs which are due and exit.',
+        )
+
+    def handle(self, *args, batch_size, poll_interval, once, **options):
+        if once:
+            ran = fanout.drain()
+            self.stdout.write(f'Ran {ran} jobs.')
+            return
+
+        while True:
+            if fanout.run_pending(batch_size) == 0:
+                time.sleep(poll_interval)
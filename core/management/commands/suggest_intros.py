@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from core import models, suggestions
+
+class Command(BaseCommand):
+    help = (
+        'Stores suggestions of connections each user may want to introduce '
+        'to each other. Run this nightly.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'usernames',
+            nargs='*',
+            help='Only update these users; defaults to all users.',
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=None,
+            help='How many suggestions to store per user.',
+        )
+
+    def handle(self, *args, usernames, limit, **options):
+        users = models.User.objects.all()
+
+        if usernames:
+            users = users.filter(username__in=usernames)
+
+        stored = 0
+        user_count = 0
+
+        for user_pk in users.values_list('pk', flat=True).iterator():
+            stored += suggestions.materialize(user_pk, limit)
+            user_count += 1
+
+        self.stdout.write(
+            f'Stored {stored} intro suggestions for {user_count} users.',
+        )
@@ -0,0 +1,58 @@
+'''
+Changes which circles connections are in, as one batch: one read of the
+existing CircleMemberships, one DELETE, one INSERT, and one statement to
+take the removed members' access to the circles' posts out of their feeds.
+Added members of circles with `backfill_post_count` set are then given the
+circles' recent posts, see `BackfillJob`.
+'''
+from django.db import transaction
+
+from . import models
+
+def remove(membership_pks):
+    # Also removes the posts the members could only see through these
+    # circles from their feeds, see FeedLinkedQuerySet
+    models.CircleMembership.objects.filter(pk__in=membership_pks).delete()
+
+def add(memberships):
+    created = models.CircleMembership.objects.bulk_create(
+        [
+            models.CircleMembership(
+                circle_id=circle_pk,
+                connection_id=connection_pk,
+            )
+            for circle_pk, connection_pk in memberships
+        ],
+        ignore_conflicts=True,
+    )
+    models.BackfillJob.enqueue([membership.pk for membership in created])
+
+@transaction.atomic
+def update(existing, selected):
+    '''
+    Makes the CircleMemberships in `existing`, a queryset, match
+    `selected`, a set of (circle pk, connection pk) pairs. The caller must
+    check that the circles and connections belong to the same user.
+
+    Returns how many memberships were added and removed.
+    '''
+    existing_pks = {
+        (circle_pk, connection_pk): pk
+        for pk, circle_pk, connection_pk
+        in existing.values_list('pk', 'circle', 'connection')
+    }
+
+    removed = [
+        pk
+        for membership, pk in existing_pks.items()
+        if membership not in selected
+    ]
+    added = selected - existing_pks.keys()
+
+    if removed:
+        remove(removed)
+
+    if added:
+        add(added)
+
+    return len(added), len(removed)
@@ -0,0 +1,55 @@
+# Generated by Django 4.2.10 on 2026-10-18 03:20
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_messages(apps, schema_editor):
+    Connection = apps.get_model("core", "Connection")
+    Message = apps.get_model("core", "Message")
+
+    def count(**filters):
+        return Coalesce(
+            Subquery(
+                Message.objects.filter(**filters)
+                .order_by()
+                .values("connection")
+                .annotate(count=Count("pk"))
+                .values("count")
+            ),
+            0,
+        )
+
+    Connection.objects.update(
+        message_count=(
+            count(connection=OuterRef("pk"))
+            + count(connection=OuterRef("opposite"))
+        ),
+        unread_count=count(connection=OuterRef("opposite"), is_read=False),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0004_fanoutjob"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="connection",
+            name="message_count",
+            field=models.PositiveIntegerField(
+                default=0, help_text="Messages sent in either direction."
+            ),
+        ),
+        migrations.AddField(
+            model_name="connection",
+            name="unread_count",
+            field=models.PositiveIntegerField(
+                default=0, help_text="Incoming messages the owner has not read."
+            ),
+        ),
+        migrations.RunPython(count_messages, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 4.2.10 on 2026-10-18 03:23
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Q, Subquery
+import django.db.models.deletion
+
+
+def find_last_messages(apps, schema_editor):
+    Connection = apps.get_model("core", "Connection")
+    Message = apps.get_model("core", "Message")
+
+    Connection.objects.update(
+        last_message=Subquery(
+            Message.objects.filter(
+                Q(connection=OuterRef("pk")) | Q(connection=OuterRef("opposite"))
+            )
+            .order_by("-created_utc")
+            .values("pk")[:1]
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0005_connection_message_counts"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="connection",
+            name="last_message",
+            field=models.ForeignKey(
+                blank=True,
+                help_text="The latest message sent in either direction.",
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="+",
+                to="core.message",
+            ),
+        ),
+        migrations.RunPython(find_last_messages, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.10 on 2026-10-18 03:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0006_connection_last_message"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="avatar_thumbnail_stem",
+            field=models.CharField(
+                blank=True,
+                help_text="Storage name, without size and extension, of the cropped thumbnails generated for the avatar; blank if there are none.",
+                max_length=256,
+            ),
+        ),
+    ]
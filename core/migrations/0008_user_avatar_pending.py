@@ -0,0 +1,26 @@
+# Generated by Django 4.2.10 on 2026-10-18 03:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0007_user_avatar_thumbnail_stem"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="avatar_pending",
+            field=models.BooleanField(
+                default=False,
+                help_text="Whether the avatar has been uploaded but not processed.",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="user",
+            name="avatar",
+            field=models.ImageField(blank=True, null=True, upload_to=""),
+        ),
+    ]
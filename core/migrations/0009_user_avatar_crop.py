@@ -0,0 +1,33 @@
+# Generated by Django 4.2.10 on 2026-10-18 03:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0008_user_avatar_pending"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="avatar_crop_x0",
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="user",
+            name="avatar_crop_x1",
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="user",
+            name="avatar_crop_y0",
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="user",
+            name="avatar_crop_y1",
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
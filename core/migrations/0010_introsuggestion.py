@@ -0,0 +1,70 @@
+# Generated by Django 4.2.10 on 2026-10-18 03:51
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0009_user_avatar_crop"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="IntroSuggestion",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                (
+                    "mutual_count",
+                    models.PositiveIntegerField(
+                        help_text="How many connections the pair have in common."
+                    ),
+                ),
+                ("created_utc", models.DateTimeField(auto_now_add=True)),
+                (
+                    "introduced",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "owner",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="intro_suggestions",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "receiver",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["owner", "-mutual_count"],
+                        name="core_introsuggestion_rank",
+                    )
+                ],
+                "unique_together": {("owner", "receiver", "introduced")},
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.10 on 2026-10-18 03:57
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_connections(apps, schema_editor):
+    User = apps.get_model("core", "User")
+    Connection = apps.get_model("core", "Connection")
+
+    User.objects.update(
+        connection_count=Coalesce(
+            Subquery(
+                Connection.objects.filter(owner=OuterRef("pk"))
+                .order_by()
+                .values("owner")
+                .annotate(count=Count("pk"))
+                .values("count")
+            ),
+            0,
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0010_introsuggestion"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="connection_count",
+            field=models.PositiveIntegerField(
+                default=0, help_text="How many connections the user has."
+            ),
+        ),
+        migrations.RunPython(count_connections, migrations.RunPython.noop),
+    ]
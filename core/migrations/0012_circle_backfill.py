@@ -0,0 +1,59 @@
+# Generated by Django 4.2.10 on 2026-10-18 04:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0011_user_connection_count"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="circle",
+            name="backfill_post_count",
+            field=models.PositiveIntegerField(
+                default=0,
+                help_text="How many of the most recent posts in the circle a new member can see. With 0, they only see posts made after they joined.",
+            ),
+        ),
+        migrations.CreateModel(
+            name="BackfillJob",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("remaining", models.PositiveIntegerField()),
+                ("cursor", models.CharField(blank=True, max_length=64)),
+                ("created_utc", models.DateTimeField(auto_now_add=True)),
+                ("run_after", models.DateTimeField(default=django.utils.timezone.now)),
+                ("attempts", models.PositiveIntegerField(default=0)),
+                ("last_error", models.TextField(blank=True)),
+                (
+                    "circle_membership",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="core.circlemembership",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["run_after"], name="core_backfilljob_run_after"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 4.2.10 on 2026-10-18 04:16
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0012_circle_backfill"),
+    ]
+
+    # Create the composite indexes before dropping the single column
+    # indexes they replace
+    operations = [
+        migrations.AddIndex(
+            model_name="invitation",
+            index=models.Index(
+                fields=["owner", "name"], name="core_invitation_owner_name"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="message",
+            index=models.Index(
+                fields=["connection", "-created_utc"], name="core_message_convo_created"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="message",
+            index=models.Index(
+                condition=models.Q(("is_read", False)),
+                fields=["connection"],
+                name="core_message_unread",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="post",
+            index=models.Index(
+                fields=["owner", "-created_utc"], name="core_post_owner_created"
+            ),
+        ),
+        migrations.AlterField(
+            model_name="invitation",
+            name="owner",
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="invitations",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="message",
+            name="connection",
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="outgoing_messages",
+                to="core.connection",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="post",
+            name="owner",
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="posts",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+    ]
@@ -0,0 +1,82 @@
+# Generated by Django 4.2.10 on 2026-10-18 04:18
+
+import core.uuids
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0013_hot_path_indexes"),
+    ]
+
+    # Primary key defaults are applied by Django rather than the database, so
+    # this only changes the migration state. Existing rows keep their random
+    # keys; new rows get time-ordered ones. Without this, SQLite would
+    # rebuild every table to change nothing.
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name="backfilljob",
+                    name="id",
+                    field=models.UUIDField(
+                        default=core.uuids.uuid7,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                migrations.AlterField(
+                    model_name="circlemembership",
+                    name="id",
+                    field=models.UUIDField(
+                        default=core.uuids.uuid7,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                migrations.AlterField(
+                    model_name="fanoutjob",
+                    name="id",
+                    field=models.UUIDField(
+                        default=core.uuids.uuid7,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                migrations.AlterField(
+                    model_name="introsuggestion",
+                    name="id",
+                    field=models.UUIDField(
+                        default=core.uuids.uuid7,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                migrations.AlterField(
+                    model_name="message",
+                    name="id",
+                    field=models.UUIDField(
+                        default=core.uuids.uuid7,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                migrations.AlterField(
+                    model_name="postcircle",
+                    name="id",
+                    field=models.UUIDField(
+                        default=core.uuids.uuid7,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+            ],
+        ),
+    ]
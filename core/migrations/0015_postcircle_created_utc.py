@@ -0,0 +1,70 @@
+# Generated by Django 4.2.10 on 2026-10-18 09:12
+
+from django.db import migrations, models
+from django.db.models import Min, OuterRef, Subquery
+
+
+def copy_created_utc(apps, schema_editor):
+    Post = apps.get_model("core", "Post")
+    PostCircle = apps.get_model("core", "PostCircle")
+
+    PostCircle.objects.update(
+        created_utc=Subquery(
+            Post.objects.filter(pk=OuterRef("post")).values("created_utc")
+        ),
+    )
+
+
+def remove_duplicate_post_users(apps, schema_editor):
+    PostUser = apps.get_model("core", "PostUser")
+
+    first_pks = (
+        PostUser.objects.order_by()
+        .values("post_circle", "circle_membership")
+        .annotate(first_pk=Min("pk"))
+        .values("first_pk")
+    )
+    PostUser.objects.exclude(pk__in=first_pks).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0014_time_ordered_ids"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="postcircle",
+            name="created_utc",
+            field=models.DateTimeField(
+                help_text="Copied from the post, so backfills can page by index.",
+                null=True,
+            ),
+        ),
+        migrations.RunPython(copy_created_utc, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="postcircle",
+            name="created_utc",
+            field=models.DateTimeField(
+                help_text="Copied from the post, so backfills can page by index."
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="postcircle",
+            index=models.Index(
+                fields=["circle", "-created_utc", "-id"],
+                name="core_postcircle_circle_created",
+            ),
+        ),
+        migrations.RunPython(
+            remove_duplicate_post_users, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name="postuser",
+            constraint=models.UniqueConstraint(
+                fields=("post_circle", "circle_membership"),
+                name="core_postuser_unique",
+            ),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.10 on 2026-10-18 05:27
+
+from django.db import migrations, models
+from django.db.models import F, Value
+from django.db.models.functions import Concat
+from PIL import features
+
+
+def add_extension(apps, schema_editor):
+    User = apps.get_model("core", "User")
+
+    # Existing thumbnails were named with the extension of the format this
+    # server makes them in
+    extension = "webp" if features.check("webp") else "jpg"
+
+    User.objects.exclude(avatar_thumbnail_stem="").update(
+        avatar_thumbnail_stem=Concat(
+            F("avatar_thumbnail_stem"), Value("." + extension)
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0015_postcircle_created_utc"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="user",
+            name="avatar_thumbnail_stem",
+            field=models.CharField(
+                blank=True,
+                help_text="Storage name, without size, of the cropped thumbnails generated for the avatar; blank if there are none.",
+                max_length=256,
+            ),
+        ),
+        migrations.RunPython(add_extension, migrations.RunPython.noop),
+    ]
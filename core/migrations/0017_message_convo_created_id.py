@@ -0,0 +1,40 @@
+# Generated by Django 4.2.10 on 2026-10-18 05:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0016_user_avatar_thumbnail_extension"),
+    ]
+
+    # core_message_unread is unchanged, but is recreated after
+    # core_message_convo_created: without statistics, SQLite picks the most
+    # recently created of two indexes on connection_id, and it should pick
+    # the partial one for unread messages
+    operations = [
+        migrations.RemoveIndex(
+            model_name="message",
+            name="core_message_convo_created",
+        ),
+        migrations.RemoveIndex(
+            model_name="message",
+            name="core_message_unread",
+        ),
+        migrations.AddIndex(
+            model_name="message",
+            index=models.Index(
+                fields=["connection", "-created_utc", "-id"],
+                name="core_message_convo_created",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="message",
+            index=models.Index(
+                condition=models.Q(("is_read", False)),
+                fields=["connection"],
+                name="core_message_unread",
+            ),
+        ),
+    ]
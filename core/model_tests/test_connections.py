@@ -1,3 +1,6 @@
+import io
+
+from django.core.management import call_command
 from django.test import TransactionTestCase
 
 from .. import models
@@ -97,3 +100,87 @@ class ConnectionTests(TransactionTestCase):
             owner=accepting_user,
             other_user=inviting_user,
         ).exists())
+
+class ConnectTests(TransactionTestCase):
+    def setUp(self):
+        self.alice = models.User.objects.create(username='alice')
+        self.bob = models.User.objects.create(username='bob')
+
+    def test_connect_links_opposites(self):
+        connection = models.Connection.objects.connect(self.alice, self.bob)
+
+        connection.refresh_from_db()
+        self.assertEqual(connection.owner, self.alice)
+        self.assertEqual(connection.other_user, self.bob)
+        self.assertEqual(connection.opposite.owner, self.bob)
+        self.assertEqual(connection.opposite.opposite, connection)
+
+    def test_connect_statement_count(self):
+        # BEGIN, a check for an existing connection, one UPDATE of both
+        # users' connection counts, one INSERT for both rows and COMMIT
+        with self.assertNumQueries(5):
+            models.Connection.objects.connect(self.alice, self.bob)
+
+    def test_cannot_connect_twice(self):
+        models.Connection.objects.connect(self.alice, self.bob)
+
+        with self.assertRaises(models.AlreadyConnectedException):
+            models.Connection.objects.connect(self.alice, self.bob)
+
+        self.assertEqual(models.Connection.objects.count(), 2)
+
+    def test_cannot_connect_with_self(self):
+        with self.assertRaises(ValueError):
+            models.Connection.objects.connect(self.alice, self.alice)
+
+        self.alice.refresh_from_db()
+        self.assertEqual(self.alice.connection_count, 0)
+        self.assertFalse(models.Connection.objects.exists())
+
+    def test_connect_enforces_limit_for_either_user(self):
+        with self.settings(MAX_CONNECTIONS_PER_USER=1):
+            carol = models.User.objects.create(username='carol')
+            models.Connection.objects.connect(self.bob, carol)
+
+            with self.assertRaises(models.ConnectionLimitException):
+                models.Connection.objects.connect(self.alice, self.bob)
+
+            with self.assertRaises(models.ConnectionLimitException):
+                models.Connection.objects.connect(self.bob, self.alice)
+
+        self.assertFalse(self.alice.connections.exists())
+        self.alice.refresh_from_db()
+        self.assertEqual(self.alice.connection_count, 0)
+
+    def test_connection_count_is_maintained(self):
+        carol = models.User.objects.create(username='carol')
+        models.Connection.objects.connect(self.alice, self.bob)
+        models.Connection.objects.connect(self.alice, carol)
+
+        self.alice.refresh_from_db()
+        self.bob.refresh_from_db()
+        self.assertEqual(self.alice.connection_count, 2)
+        self.assertEqual(self.bob.connection_count, 1)
+
+        models.Connection.objects.filter(
+            owner=self.bob,
+            other_user=self.alice,
+        ).delete()
+
+        self.alice.refresh_from_db()
+        self.bob.refresh_from_db()
+        self.assertEqual(self.alice.connection_count, 1)
+        self.assertEqual(self.bob.connection_count, 0)
+
+    def test_reconcile_connection_counts(self):
+        models.Connection.objects.connect(self.alice, self.bob)
+        models.User.objects.filter(pk=self.alice.pk).update(
+            connection_count=5,
+        )
+
+        out = io.StringIO()
+        call_command('reconcile_connection_counts', stdout=out)
+
+        self.alice.refresh_from_db()
+        self.assertEqual(self.alice.connection_count, 1)
+        self.assertIn('Repaired 1 drifted users.', out.getvalue())
@@ -1,4 +1,9 @@
+import io
+
+from django.core.management import call_command
+from django.db import connection
 from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
 
 from .. import models
 
@@ -248,6 +253,334 @@ class FeedTests(TransactionTestCase):
 
         self.assertEqual(reading_user.feed.count(), 0)
 
+    def test_feed_is_ordered_newest_first(self):
+        user = models.User.objects.create_user(
+            username='user',
+            password='12345',
+        )
+
+        older = models.Post.objects.create(owner=user, text='Older')
+        newer = models.Post.objects.create(owner=user, text='Newer')
+
+        self.assertEqual(list(user.feed.all()), [newer, older])
+
+    def test_removing_one_of_two_circles_keeps_post_in_feed(self):
+        posting_user = models.User.objects.create_user(
+            username='posting_user',
+            password='12345',
+        )
+        reading_user = models.User.objects.create_user(
+            username='reading_user',
+            password='12345',
+        )
+
+        invitation = posting_user.create_invitation(
+            circles=posting_user.circles.all(),
+        )
+        reading_user.accept_invitation(
+            invitation,
+            circles=reading_user.circles.filter(name='Friends'),
+        )
+
+        post = models.Post.objects.create(
+            owner=posting_user,
+            text='Hello, world',
+        )
+        post.publish(circles=posting_user.circles.all())
+
+        posting_user.circles.filter(name='Friends').delete()
+
+        self.assertIn(post, reading_user.feed.all())
+
+class PublishTests(TransactionTestCase):
+    def create_reader_in_all_circles(self, posting_user, username):
+        reading_user = models.User.objects.create_user(
+            username=username,
+            password='12345',
+        )
+        invitation = posting_user.create_invitation(
+            circles=posting_user.circles.all(),
+        )
+        reading_user.accept_invitation(
+            invitation,
+            circles=reading_user.circles.filter(name='Friends'),
+        )
+        return reading_user
+
+    def count_publish_statements(self, posting_user):
+        post = models.Post.objects.create(
+            owner=posting_user,
+            text='Hello, world',
+        )
+
+        with CaptureQueriesContext(connection) as queries:
+            post.publish(circles=posting_user.circles.all())
+
+        return len(queries)
+
+    def test_publish_statement_count_does_not_grow_with_readers(self):
+        # Before batching, publishing to 2 circles of 150 connections took
+        # 311 statements; it now takes the same handful at any size.
+        posting_user = models.User.objects.create_user(
+            username='posting_user',
+            password='12345',
+        )
+        self.create_reader_in_all_circles(posting_user, 'reader0')
+
+        few_readers = self.count_publish_statements(posting_user)
+
+        for i in range(1, 10):
+            self.create_reader_in_all_circles(posting_user, f'reader{i}')
+
+        many_readers = self.count_publish_statements(posting_user)
+
+        self.assertEqual(few_readers, many_readers)
+        self.assertLessEqual(many_readers, 8)
+
+    def test_publish_collapses_readers_in_multiple_circles(self):
+        posting_user = models.User.objects.create_user(
+            username='posting_user',
+            password='12345',
+        )
+        reading_user = self.create_reader_in_all_circles(
+            posting_user,
+            'reading_user',
+        )
+
+        post = models.Post.objects.create(
+            owner=posting_user,
+            text='Hello, world',
+        )
+        post.publish(circles=posting_user.circles.all())
+
+        self.assertEqual(models.PostUser.objects.count(), 2)
+        self.assertEqual(
+            models.FeedEntry.objects.filter(reader=reading_user).count(),
+            1,
+        )
+
+    def test_publish_twice_to_same_circle(self):
+        posting_user = models.User.objects.create_user(
+            username='posting_user',
+            password='12345',
+        )
+        reading_user = self.create_reader_in_all_circles(
+            posting_user,
+            'reading_user',
+        )
+
+        post = models.Post.objects.create(
+            owner=posting_user,
+            text='Hello, world',
+        )
+        post.publish(circles=posting_user.circles.filter(name='Friends'))
+        post.publish(circles=posting_user.circles.all())
+
+        self.assertEqual(models.PostCircle.objects.count(), 2)
+        self.assertEqual(models.PostUser.objects.count(), 2)
+        self.assertEqual(list(reading_user.feed.all()), [post])
+
+class CircleBackfillTests(TransactionTestCase):
+    def setUp(self):
+        self.posting_user = models.User.objects.create_user(
+            username='posting_user',
+            password='12345',
+        )
+        self.reading_user = models.User.objects.create_user(
+            username='reading_user',
+            password='12345',
+        )
+        self.friends = self.posting_user.circles.get(name='Friends')
+        self.posts = []
+
+        for i in range(5):
+            post = models.Post.objects.create(
+                owner=self.posting_user,
+                text='Post {}'.format(i),
+            )
+            post.publish(circles=[self.friends])
+            self.posts.append(post)
+
+    def connect(self):
+        invitation = self.posting_user.create_invitation(
+            circles=self.posting_user.circles.filter(name='Friends'),
+        )
+        self.reading_user.accept_invitation(
+            invitation,
+            circles=self.reading_user.circles.filter(name='Friends'),
+        )
+
+    def test_new_member_gets_most_recent_posts(self):
+        self.friends.backfill_post_count = 3
+        self.friends.save()
+
+        self.connect()
+
+        self.assertEqual(
+            list(self.reading_user.feed.all()),
+            self.posts[:1:-1],
+        )
+
+    def test_backfill_count_larger_than_circle(self):
+        self.friends.backfill_post_count = 100
+        self.friends.save()
+
+        self.connect()
+
+        self.assertEqual(
+            list(self.reading_user.feed.all()),
+            self.posts[::-1],
+        )
+
+    def test_backfilled_posts_are_removed_with_membership(self):
+        self.friends.backfill_post_count = 3
+        self.friends.save()
+        self.connect()
+
+        models.CircleMembership.objects.filter(circle=self.friends).delete()
+
+        self.assertFalse(self.reading_user.feed.exists())
+
+    def test_backfill_is_done_in_batches(self):
+        self.connect()
+        membership = models.CircleMembership.objects.select_related(
+            'connection',
+        ).get(circle=self.friends)
+        job = models.BackfillJob(circle_membership=membership, remaining=4)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertFalse(job.run_batch(batch_size=3))
+
+        # Reading a page of PostCircles and the two INSERTs in a
+        # transaction, no matter how many posts the circle has
+        self.assertEqual(len(queries), 5)
+        self.assertEqual(job.remaining, 1)
+        self.assertEqual(self.reading_user.feed.count(), 3)
+
+        self.assertTrue(job.run_batch(batch_size=3))
+        self.assertEqual(job.remaining, 0)
+        self.assertEqual(
+            list(self.reading_user.feed.all()),
+            self.posts[:0:-1],
+        )
+
+    def test_backfill_skips_posts_already_linked(self):
+        self.connect()
+        membership = models.CircleMembership.objects.get(circle=self.friends)
+        post = models.Post.objects.create(
+            owner=self.posting_user,
+            text='Published while the backfill was queued',
+        )
+        post.publish(circles=[self.friends])
+
+        self.assertIsNone(membership.backfill(10))
+        self.assertIsNone(membership.backfill(10))
+
+        self.assertEqual(
+            models.PostUser.objects.filter(
+                circle_membership=membership,
+            ).count(),
+            6,
+        )
+        self.assertEqual(
+            list(self.reading_user.feed.all()),
+            [post] + self.posts[::-1],
+        )
+
+class DeleteQueryCountTests(TransactionTestCase):
+    def count_delete_queries(self, reader_count, delete):
+        owner = models.User.objects.create(
+            username='owner{}'.format(reader_count),
+        )
+        friends = owner.circles.get(name='Friends')
+
+        for i in range(reader_count):
+            reader = models.User.objects.create(
+                username='reader{}.{}'.format(reader_count, i),
+            )
+            models.CircleMembership.objects.create(
+                circle=friends,
+                connection=models.Connection.objects.connect(owner, reader),
+            )
+
+        post = models.Post.objects.create(owner=owner, text='Hello')
+        post.publish(circles=[friends])
+        post_pk = post.pk
+
+        with CaptureQueriesContext(connection) as queries:
+            delete(post, friends)
+
+        self.assertEqual(models.PostUser.objects.count(), 0)
+        self.assertFalse(
+            models.FeedEntry.objects.filter(
+                post=post_pk,
+            ).exclude(reader=owner).exists(),
+        )
+        return len(queries)
+
+    def test_post_delete_does_not_grow_with_readers(self):
+        def delete(post, circle):
+            post.delete()
+
+        self.assertEqual(
+            self.count_delete_queries(1, delete),
+            self.count_delete_queries(20, delete),
+        )
+
+    def test_circle_delete_does_not_grow_with_readers(self):
+        def delete(post, circle):
+            circle.delete()
+
+        self.assertEqual(
+            self.count_delete_queries(1, delete),
+            self.count_delete_queries(20, delete),
+        )
+
+class BackfillFeedTests(TransactionTestCase):
+    def test_backfill_restores_feed(self):
+        posting_user = models.User.objects.create_user(
+            username='posting_user',
+            password='12345',
+        )
+        reading_user = models.User.objects.create_user(
+            username='reading_user',
+            password='12345',
+        )
+
+        invitation = posting_user.create_invitation(
+            circles=posting_user.circles.all(),
+        )
+        reading_user.accept_invitation(
+            invitation,
+            circles=reading_user.circles.filter(name='Friends'),
+        )
+
+        post = models.Post.objects.create(
+            owner=posting_user,
+            text='Hello, world',
+        )
+        post.publish(circles=posting_user.circles.all())
+
+        models.FeedEntry.objects.all().delete()
+        self.assertEqual(reading_user.feed.count(), 0)
+
+        call_command('backfill_feed', stdout=io.StringIO())
+
+        self.assertEqual(list(reading_user.feed.all()), [post])
+        self.assertEqual(list(posting_user.feed.all()), [post])
+
+    def test_backfill_is_idempotent(self):
+        user = models.User.objects.create_user(
+            username='user',
+            password='12345',
+        )
+        models.Post.objects.create(owner=user, text='Hello, world')
+
+        call_command('backfill_feed', stdout=io.StringIO())
+        call_command('backfill_feed', stdout=io.StringIO())
+
+        self.assertEqual(models.FeedEntry.objects.count(), 1)
+
 class FeedForUserTests(TransactionTestCase):
     def test_feed_for_self_starts_empty(self):
         user = models.User.objects.create_user(
@@ -1,3 +1,8 @@
+from datetime import timedelta
+import io
+from unittest import mock
+
+from django.core.management import call_command
 from django.test import TransactionTestCase
 
 from .. import models
@@ -51,3 +56,110 @@ class MessageTests(TransactionTestCase):
         )
         self.assertEqual(receiving_connection.messages.count(), 1)
         self.assertEqual(receiving_connection.messages.first(), message)
+
+class MessageCountTests(TransactionTestCase):
+    def setUp(self):
+        self.sending_user = models.User.objects.create_user(
+            username='sending_user',
+            password='12345',
+        )
+        self.receiving_user = models.User.objects.create_user(
+            username='receiving_user',
+            password='12345',
+        )
+
+        invitation = self.sending_user.create_invitation(
+            circles=self.sending_user.circles.filter(name='Friends'),
+        )
+        self.receiving_user.accept_invitation(
+            invitation,
+            circles=self.receiving_user.circles.filter(name='Friends'),
+        )
+
+    def connection_of(self, user):
+        return user.connections.get()
+
+    def test_sending_message_updates_counts(self):
+        self.sending_user.send_message_to(self.receiving_user, text='Hi')
+        self.sending_user.send_message_to(self.receiving_user, text='Hi?')
+        self.receiving_user.send_message_to(self.sending_user, text='Hello')
+
+        sending_connection = self.connection_of(self.sending_user)
+        receiving_connection = self.connection_of(self.receiving_user)
+
+        self.assertEqual(sending_connection.message_count, 3)
+        self.assertEqual(sending_connection.unread_count, 1)
+        self.assertEqual(receiving_connection.message_count, 3)
+        self.assertEqual(receiving_connection.unread_count, 2)
+        self.assertEqual(self.receiving_user.unread_message_count, 2)
+
+    def test_mark_read_clears_unread_count(self):
+        self.sending_user.send_message_to(self.receiving_user, text='Hi')
+        self.receiving_user.send_message_to(self.sending_user, text='Hello')
+
+        receiving_connection = self.connection_of(self.receiving_user)
+
+        self.assertEqual(receiving_connection.mark_read(), 1)
+        self.assertEqual(receiving_connection.unread_count, 0)
+        self.assertEqual(self.receiving_user.unread_message_count, 0)
+        self.assertEqual(
+            self.connection_of(self.sending_user).unread_count,
+            1,
+        )
+
+    def test_mark_read_with_drifted_unread_count(self):
+        self.sending_user.send_message_to(self.receiving_user, text='Hi')
+        self.sending_user.send_message_to(self.receiving_user, text='Hi?')
+        models.Connection.objects.update(unread_count=1)
+
+        receiving_connection = self.connection_of(self.receiving_user)
+
+        self.assertEqual(receiving_connection.mark_read(), 2)
+        self.assertEqual(receiving_connection.unread_count, 0)
+
+    def test_last_message_is_latest_in_either_direction(self):
+        self.sending_user.send_message_to(self.receiving_user, text='Hi')
+        reply = self.receiving_user.send_message_to(
+            self.sending_user,
+            text='Hello',
+        )
+
+        self.assertEqual(
+            self.connection_of(self.sending_user).last_message,
+            reply,
+        )
+        self.assertEqual(
+            self.connection_of(self.receiving_user).last_message,
+            reply,
+        )
+
+    def test_older_message_saved_later_is_not_last_message(self):
+        reply = self.receiving_user.send_message_to(
+            self.sending_user,
+            text='Hello',
+        )
+        # e.g. saved concurrently, in a transaction which committed later
+        earlier = reply.created_utc - timedelta(seconds=1)
+
+        with mock.patch('django.utils.timezone.now', return_value=earlier):
+            self.sending_user.send_message_to(self.receiving_user, text='Hi')
+
+        for user in (self.sending_user, self.receiving_user):
+            connection = self.connection_of(user)
+            self.assertEqual(connection.last_message, reply)
+            self.assertEqual(connection.message_count, 2)
+
+    def test_reconcile_repairs_drift(self):
+        self.sending_user.send_message_to(self.receiving_user, text='Hi')
+        models.Connection.objects.update(message_count=7, unread_count=7)
+
+        out = io.StringIO()
+        call_command('reconcile_message_counts', stdout=out)
+
+        self.assertIn('Repaired 2', out.getvalue())
+        sending_connection = self.connection_of(self.sending_user)
+        receiving_connection = self.connection_of(self.receiving_user)
+        self.assertEqual(sending_connection.message_count, 1)
+        self.assertEqual(sending_connection.unread_count, 0)
+        self.assertEqual(receiving_connection.message_count, 1)
+        self.assertEqual(receiving_connection.unread_count, 1)
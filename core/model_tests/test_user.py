@@ -1,7 +1,21 @@
+from concurrent.futures import ThreadPoolExecutor
+import io
+import multiprocessing
+import os
+import shutil
+import tempfile
+
 from django.conf import settings
-from django.test import tag, TransactionTestCase
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings, tag, TransactionTestCase
+from PIL import Image
+
+from .. import avatars, images, models
 
-from .. import models
+def make_image_file(name, size, color='red'):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color).save(buffer, format='PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), 'image/png')
 
 class GeneralUserTests(TransactionTestCase):
     def test_user_display_name(self):
@@ -340,3 +354,196 @@ class AcceptInvitationTests(TransactionTestCase):
             inviting_user,
             accepting_user.circles.get(name='Family').members.all(),
         )
+
+class AvatarThumbnailTests(TransactionTestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+
+        self.user = models.User.objects.create_user(
+            username='testuser',
+            password='12345',
+        )
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root)
+
+    def test_no_thumbnails_without_avatar(self):
+        self.user.process_avatar()
+
+        self.assertEqual(self.user.avatar_thumbnails, {})
+
+    def test_generate_thumbnails(self):
+        self.user.avatar = make_image_file('cat.png', (300, 200))
+        self.user.save()
+
+        self.user.process_avatar()
+
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.avatar_thumbnail_stem)
+        self.assertEqual(
+            set(self.user.avatar_thumbnails),
+            set(str(size) for size in images.THUMBNAIL_SIZES),
+        )
+
+        storage = self.user.avatar.storage
+        for size in images.THUMBNAIL_SIZES:
+            name = images.thumbnail_name(self.user.avatar_thumbnail_stem, size)
+            with storage.open(name) as thumbnail_file:
+                with Image.open(thumbnail_file) as thumbnail:
+                    self.assertEqual(thumbnail.size, (size, size))
+
+    def test_new_avatar_replaces_thumbnails(self):
+        self.user.avatar = make_image_file('cat.png', (300, 200))
+        self.user.save()
+        self.user.process_avatar()
+        old_stem = self.user.avatar_thumbnail_stem
+
+        self.user.avatar = make_image_file('dog.png', (200, 300), 'blue')
+        self.user.save()
+        self.user.process_avatar()
+
+        storage = self.user.avatar.storage
+        self.assertNotEqual(self.user.avatar_thumbnail_stem, old_stem)
+        self.assertFalse(storage.exists(images.thumbnail_name(old_stem, 80)))
+        self.assertTrue(storage.exists(
+            images.thumbnail_name(self.user.avatar_thumbnail_stem, 80),
+        ))
+
+    def test_processing_replaces_raw_upload(self):
+        self.user.avatar = make_image_file('cat.png', (300, 200))
+        self.user.save()
+        raw_name = self.user.avatar.name
+
+        self.assertTrue(self.user.process_avatar())
+
+        self.user.refresh_from_db()
+        self.assertNotEqual(self.user.avatar.name, raw_name)
+        self.assertFalse(self.user.avatar.storage.exists(raw_name))
+        self.assertEqual(
+            (self.user.avatar_width, self.user.avatar_height),
+            (300, 200),
+        )
+
+    def test_processing_is_discarded_if_avatar_changed(self):
+        self.user.avatar = make_image_file('cat.png', (300, 200))
+        self.user.save()
+        stale_user = models.User.objects.get(pk=self.user.pk)
+
+        self.user.avatar = make_image_file('dog.png', (200, 300))
+        self.user.save()
+
+        self.assertFalse(stale_user.process_avatar())
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.avatar_thumbnail_stem, '')
+        self.assertEqual(
+            sorted(os.listdir(self.media_root)),
+            sorted([stale_user.avatar.name, self.user.avatar.name]),
+        )
+
+    def test_changing_crop_regenerates_thumbnails(self):
+        self.user.avatar = make_image_file('cat.png', (300, 200))
+        self.user.save()
+        self.user.process_avatar()
+        centered_stem = self.user.avatar_thumbnail_stem
+
+        self.user.avatar_crop_x0 = 0
+        self.user.avatar_crop_x1 = 200
+        self.user.avatar_crop_y0 = 0
+        self.user.avatar_crop_y1 = 200
+        self.user.save()
+
+        self.assertTrue(self.user.generate_avatar_thumbnails())
+
+        storage = self.user.avatar.storage
+        self.assertNotEqual(self.user.avatar_thumbnail_stem, centered_stem)
+        self.assertFalse(
+            storage.exists(images.thumbnail_name(centered_stem, 80)),
+        )
+        self.assertTrue(storage.exists(
+            images.thumbnail_name(self.user.avatar_thumbnail_stem, 80),
+        ))
+
+    def test_unchanged_crop_is_not_regenerated(self):
+        self.user.avatar = make_image_file('cat.png', (300, 200))
+        self.user.save()
+        self.user.process_avatar()
+        stem = self.user.avatar_thumbnail_stem
+
+        self.assertFalse(self.user.generate_avatar_thumbnails())
+        self.assertEqual(self.user.avatar_thumbnail_stem, stem)
+
+class AvatarProcessingTests(TransactionTestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root)
+
+    def create_user(self, username, avatar):
+        return models.User.objects.create(
+            username=username,
+            avatar=avatar,
+            avatar_pending=True,
+        )
+
+    def run_pending(self):
+        # A thread pool, since `manage.py test --parallel` runs tests in
+        # daemonic processes, which can't start a process pool
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            return avatars.run_pending(executor=executor)
+
+    def test_run_pending(self):
+        for username in ('alice', 'bob', 'carol'):
+            self.create_user(username, make_image_file('a.png', (30, 20)))
+
+        processed, rejected = self.run_pending()
+
+        self.assertEqual((processed, rejected), (3, 0))
+        self.assertFalse(avatars.pending_users().exists())
+
+        for user in models.User.objects.all():
+            self.assertTrue(user.avatar_thumbnail_stem)
+            self.assertEqual(user.avatar_width, 30)
+
+    def test_run_pending_processes_in_pool(self):
+        # Checked here, not in a decorator, because the parallel test runner
+        # imports tests before starting its daemonic worker processes
+        if multiprocessing.current_process().daemon:
+            self.skipTest('Daemonic processes cannot start a process pool')
+
+        for username in ('alice', 'bob', 'carol'):
+            self.create_user(username, make_image_file('a.png', (30, 20)))
+
+        processed, rejected = avatars.run_pending(processes=2)
+
+        self.assertEqual((processed, rejected), (3, 0))
+        self.assertFalse(avatars.pending_users().exists())
+
+        for user in models.User.objects.all():
+            self.assertTrue(user.avatar_thumbnail_stem)
+            self.assertEqual(user.avatar_width, 30)
+
+    def test_unreadable_avatars_are_rejected(self):
+        user = self.create_user(
+            'alice',
+            SimpleUploadedFile('a.png', b'not an image', 'image/png'),
+        )
+
+        processed, rejected = self.run_pending()
+
+        self.assertEqual((processed, rejected), (0, 1))
+
+        user.refresh_from_db()
+        self.assertFalse(user.avatar)
+        self.assertFalse(user.avatar_pending)
+        self.assertEqual(os.listdir(self.media_root), [])
+
+    def test_run_pending_does_nothing_without_pending_avatars(self):
+        self.assertEqual(self.run_pending(), (0, 0))
@@ -1,14 +1,21 @@
+import contextlib
 from datetime import timedelta
+import os
 import uuid
 import zoneinfo
 
 from django.conf import settings
+from django.core.files.base import ContentFile
 from django.db import models, transaction
+from django.db.models import signals
+from django.db.models.functions import Greatest
+from django.dispatch import receiver
 from django.urls import reverse
 from django.utils import timezone
+from django.utils.functional import cached_property
 import django.contrib.auth.models as auth_models
 
-from . import images, validators
+from . import graph, images, pagination, uuids, validators
 
 TIMEZONE_CHOICES = [
     ('', '(default)'),
@@ -31,14 +38,40 @@ class User(auth_models.AbstractUser):
         max_length=256,
     )
 
+    # The dimensions and thumbnails are filled in when the upload is
+    # processed, see `process_avatar()`.
     avatar = models.ImageField(
         null=True,
         blank=True,
-        height_field='avatar_height',
-        width_field='avatar_width',
     )
     avatar_height = models.PositiveIntegerField(default=0)
     avatar_width = models.PositiveIntegerField(default=0)
+    avatar_thumbnail_stem = models.CharField(
+        blank=True,
+        max_length=256,
+        help_text=(
+            'Storage name, without size, of the cropped thumbnails '
+            'generated for the avatar; blank if there are none.'
+        ),
+    )
+    avatar_pending = models.BooleanField(
+        default=False,
+        help_text='Whether the avatar has been uploaded but not processed.',
+    )
+    # The square area of the avatar shown, in pixels. If these are null, the
+    # largest square in the middle of the avatar is shown.
+    avatar_crop_x0 = models.PositiveIntegerField(null=True, blank=True)
+    avatar_crop_x1 = models.PositiveIntegerField(null=True, blank=True)
+    avatar_crop_y0 = models.PositiveIntegerField(null=True, blank=True)
+    avatar_crop_y1 = models.PositiveIntegerField(null=True, blank=True)
+
+    # Maintained by Connection.objects.connect and the Connection
+    # post_delete receiver; run `manage.py reconcile_connection_counts` if
+    # it drifts.
+    connection_count = models.PositiveIntegerField(
+        default=0,
+        help_text='How many connections the user has.',
+    )
 
     # Settings Fields
     timezone = models.CharField(
@@ -88,49 +121,211 @@ class User(auth_models.AbstractUser):
 
     @property
     def avatar_crop(self):
-        # TODO Allow users to set the crop values
-
-        x0 = 0
-        x1 = self.avatar_width
-        y0 = 0
-        y1 = self.avatar_height
-
-        if self.avatar_height > self.avatar_width:
-            y0 = (self.avatar_height - self.avatar_width) // 2
-            y1 = (self.avatar_height + self.avatar_width) // 2
-
-        elif self.avatar_width > self.avatar_height:
-            x0 = (self.avatar_width - self.avatar_height) // 2
-            x1 = (self.avatar_width + self.avatar_height) // 2
+        if self.avatar_crop_x0 is None:
+            return images.centered_crop(self.avatar_width, self.avatar_height)
 
         return images.ImageCrop(
             image_width=self.avatar_width,
             image_height=self.avatar_height,
-            x0=x0,
-            x1=x1,
-            y0=y0,
-            y1=y1,
+            x0=self.avatar_crop_x0,
+            x1=self.avatar_crop_x1,
+            y0=self.avatar_crop_y0,
+            y1=self.avatar_crop_y1,
         )
 
+    @cached_property
+    def avatar_crop_style(self):
+        '''
+        The inline CSS for cropping the avatar, see `images.crop_style()`.
+        Pages showing many avatars set this in one batch instead, see the
+        `with_avatar_crop_styles` template filter.
+        '''
+        return images.crop_style(self.avatar_crop)
+
     @property
-    def feed(self):
-        connection_pks = Connection.objects.filter(other_user=self)
+    def avatar_thumbnails(self):
+        '''
+        URLs of the avatar's square thumbnails, keyed by size as a string so
+        templates can look them up, e.g. `user.avatar_thumbnails.80`.
+        '''
+        if not self.avatar_thumbnail_stem:
+            return {}
+
+        return {
+            str(size): self.avatar.storage.url(
+                images.thumbnail_name(self.avatar_thumbnail_stem, size),
+            )
+            for size in images.THUMBNAIL_SIZES
+        }
+
+    def process_avatar(self, processed=None):
+        '''
+        Replaces the raw upload with the processed avatar and its thumbnails,
+        and deletes the previous ones. `processed` is the result of
+        `images.process_image()` on the raw upload; it is computed here if it
+        is not given. If there is no avatar, this only deletes thumbnails.
+
+        Returns False, and stores nothing, if the avatar was changed again
+        since this user was loaded.
+        '''
+        storage = self.avatar.storage
+        raw_name = self.avatar.name or ''
+        previous_stem = self.avatar_thumbnail_stem
+
+        if raw_name:
+            if processed is None:
+                with self.avatar.open('rb') as avatar_file:
+                    processed = images.process_image(avatar_file.read())
+
+            stem, _ = os.path.splitext(raw_name)
+            name = storage.save(
+                '{}.{}'.format(stem, processed.extension),
+                ContentFile(processed.data),
+            )
+            thumbnail_stem = images.thumbnail_stem(
+                name,
+                images.thumbnail_key(processed.data, processed.crop),
+                processed.thumbnail_extension,
+            )
 
-        circle_membership_pks = CircleMembership.objects.filter(
-            connection__pk__in=connection_pks,
-        ).values_list('pk', flat=True)
+            self._save_avatar_thumbnails(thumbnail_stem, processed.thumbnails)
+
+            changes = {
+                'avatar': name,
+                'avatar_width': processed.crop.image_width,
+                'avatar_height': processed.crop.image_height,
+                'avatar_thumbnail_stem': thumbnail_stem,
+                'avatar_pending': False,
+                # The processed thumbnails use the centered crop
+                'avatar_crop_x0': None,
+                'avatar_crop_x1': None,
+                'avatar_crop_y0': None,
+                'avatar_crop_y1': None,
+            }
+        else:
+            name = ''
+            thumbnail_stem = ''
+            changes = {
+                'avatar_thumbnail_stem': '',
+                'avatar_pending': False,
+            }
+
+        if raw_name:
+            unchanged = models.Q(avatar=raw_name)
+        else:
+            unchanged = models.Q(avatar='') | models.Q(avatar__isnull=True)
 
-        post_pks = PostUser.objects.filter(
-            circle_membership__pk__in=circle_membership_pks,
-        ).values_list('post_circle__post__pk', flat=True)
+        updated = User.objects.filter(unchanged, pk=self.pk).update(**changes)
 
-        return self.posts.union(
-            Post.objects.filter(pk__in=post_pks),
-        ).order_by('-created_utc')
+        if updated:
+            for field, value in changes.items():
+                setattr(self, field, value)
+
+            # Clean up the raw upload and the previous avatar's thumbnails
+            discard_name, discard_stem = raw_name, previous_stem
+        else:
+            # Another upload won the race, so clean up what was written here
+            discard_name, discard_stem = name, thumbnail_stem
+
+        if discard_name:
+            storage.delete(discard_name)
+
+        self._delete_avatar_thumbnails(discard_stem)
+
+        return bool(updated)
+
+    def generate_avatar_thumbnails(self):
+        '''
+        Regenerates the thumbnails of a processed avatar after its crop has
+        changed. Thumbnails are named by a hash of the avatar and its crop,
+        so this does nothing if neither changed.
+
+        Returns False, and stores nothing, if the avatar or its thumbnails
+        were changed again since this user was loaded.
+        '''
+        if not self.avatar or self.avatar_pending:
+            return False
+
+        with self.avatar.open('rb') as avatar_file:
+            image_data = avatar_file.read()
+
+        crop = self.avatar_crop
+        previous_stem = self.avatar_thumbnail_stem
+        _, extension = images.thumbnail_format()
+        stem = images.thumbnail_stem(
+            self.avatar.name,
+            images.thumbnail_key(image_data, crop),
+            extension,
+        )
+
+        if stem == previous_stem:
+            return False
+
+        self._save_avatar_thumbnails(
+            stem,
+            images.make_thumbnails_from_data(image_data, crop),
+        )
+
+        updated = User.objects.filter(
+            pk=self.pk,
+            avatar=self.avatar.name,
+            avatar_thumbnail_stem=previous_stem,
+        ).update(avatar_thumbnail_stem=stem)
+
+        if updated:
+            self.avatar_thumbnail_stem = stem
+            self._delete_avatar_thumbnails(previous_stem)
+        else:
+            self._delete_avatar_thumbnails(stem)
+
+        return bool(updated)
+
+    def discard_avatar_thumbnails(self):
+        '''
+        Deletes the thumbnails after the crop has changed, when they are
+        regenerated later by `manage.py process_avatars`. Until then the
+        avatar is cropped in CSS.
+        '''
+        previous_stem = self.avatar_thumbnail_stem
+
+        updated = User.objects.filter(
+            pk=self.pk,
+            avatar_thumbnail_stem=previous_stem,
+        ).update(avatar_thumbnail_stem='')
+
+        if updated:
+            self.avatar_thumbnail_stem = ''
+            self._delete_avatar_thumbnails(previous_stem)
+
+    def _save_avatar_thumbnails(self, stem, thumbnails):
+        storage = self.avatar.storage
+
+        for size, content in thumbnails.items():
+            name = images.thumbnail_name(stem, size)
+
+            if not storage.exists(name):
+                storage.save(name, ContentFile(content))
+
+    def _delete_avatar_thumbnails(self, stem):
+        if not stem:
+            return
+
+        for size in images.THUMBNAIL_SIZES:
+            self.avatar.storage.delete(images.thumbnail_name(stem, size))
+
+    @property
+    def feed(self):
+        # Feed entries are written when posts are published, so reading the
+        # feed is a single range scan over the (reader, created_utc) index.
+        return Post.objects.with_owner().filter(
+            feed_entries__reader=self,
+        ).annotate(
+            feed_created_utc=models.F('feed_entries__created_utc'),
+        ).order_by('-feed_created_utc', '-pk')
 
     def feed_for_user(self, user):
         if self == user:
-            return self.posts.all()
+            return self.posts.with_owner()
 
         connection_pks = Connection.objects.filter(
             owner=user,
@@ -145,7 +340,7 @@ class User(auth_models.AbstractUser):
             circle_membership__pk__in=circle_membership_pks,
         ).values_list('post_circle__post__pk', flat=True)
 
-        return Post.objects.filter(pk__in=post_pks)
+        return Post.objects.with_owner().filter(pk__in=post_pks)
 
     @property
     def open_intros(self):
@@ -161,19 +356,22 @@ class User(auth_models.AbstractUser):
             pk__in=connected_users,
         )
 
+    # Access checks read connections from the database rather than the cache
+    # in core/graph.py, which another process may not have invalidated yet
     @property
     def connected_users(self):
         return User.objects.filter(
-            pk__in=self.connections.values_list(
-                'other_user',
-                flat=True,
-            ),
+            pk__in=self.connections.values_list('other_user', flat=True),
         )
 
+    @property
+    def unread_message_count(self):
+        return self.connections.aggregate(
+            unread_count=models.Sum('unread_count'),
+        )['unread_count'] or 0
+
     def is_connected_with(self, other_user):
-        return self.connections.filter(
-            other_user=other_user,
-        ).exists()
+        return self.connections.filter(other_user=other_user).exists()
 
     def send_message_to(self, other_user, *, text:str):
         return Message.objects.create(
@@ -181,14 +379,6 @@ class User(auth_models.AbstractUser):
             text=text,
         )
 
-    @property
-    def connected_users(self):
-        return User.objects.filter(
-            pk__in=Connection.objects.filter(
-                owner=self,
-            ).values_list('other_user', flat=True),
-        )
-
     @transaction.atomic
     def create_invitation(self, *, circles):
         circles_count = circles.count()
@@ -199,7 +389,9 @@ class User(auth_models.AbstractUser):
         if circles_count != circles.filter(owner=self).count():
             raise Exception('Cannot invite to circle you do not own')
 
-        if self.connections.count() >= settings.MAX_CONNECTIONS_PER_USER:
+        self.refresh_from_db(fields=['connection_count'])
+
+        if self.connection_count >= settings.MAX_CONNECTIONS_PER_USER:
             raise ConnectionLimitException('Connection limit reached')
 
         invitation = Invitation.objects.create(owner=self)
@@ -252,7 +444,9 @@ class Invitation(models.Model):
     owner = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
-        related_name='invitations'
+        related_name='invitations',
+        # Covered by core_invitation_owner_name
+        db_index=False,
     )
     created_utc = models.DateTimeField(auto_now_add=True)
     name = models.CharField(max_length=256)
@@ -266,6 +460,15 @@ class Invitation(models.Model):
     is_open = models.BooleanField(default=False)
     expires_at = models.DateTimeField(null=True, blank=True)
 
+    class Meta:
+        indexes = (
+            # The invitation list, see InvitationListView
+            models.Index(
+                fields=('owner', 'name'),
+                name='core_invitation_owner_name',
+            ),
+        )
+
     def is_expired(self):
         if not self.is_open and self.expires_at:
             return timezone.now() > self.expires_at
@@ -369,6 +572,136 @@ class Intro(models.Model):
 
         return result
 
+class IntroSuggestion(models.Model):
+    '''
+    A pair of `owner`'s connections who are not connected with each other,
+    and who `owner` may want to introduce. These are computed by
+    `manage.py suggest_intros` (see `core.suggestions`), so they can be a
+    little out of date.
+
+    Each pair is stored once, with `receiver` and `introduced` in pk order.
+    '''
+    id = models.UUIDField(
+        primary_key=True,
+        default=uuids.uuid7,
+        editable=False,
+    )
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='intro_suggestions',
+    )
+    receiver = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    introduced = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    mutual_count = models.PositiveIntegerField(
+        help_text='How many connections the pair have in common.',
+    )
+    created_utc = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = (('owner', 'receiver', 'introduced'),)
+        indexes = (
+            models.Index(
+                fields=('owner', '-mutual_count'),
+                name='core_introsuggestion_rank',
+            ),
+        )
+
+class FeedLinkedQuerySet(models.QuerySet):
+    '''
+    A queryset of a model which PostUsers cascade from. Deleting rows
+    removes the FeedEntries the cascade leaves stale in a fixed number of
+    queries, however many readers the rows linked posts to.
+    '''
+    # The PostUser field which leads to this model
+    post_user_lookup = None
+
+    def post_users(self):
+        return PostUser.objects.filter(**{
+            '{}__in'.format(self.post_user_lookup): self.values('pk'),
+        })
+
+    def delete(self):
+        with transaction.atomic(savepoint=False):
+            with feed_cleanup(self.post_users()):
+                return super().delete()
+
+class ConnectionQuerySet(FeedLinkedQuerySet):
+    post_user_lookup = 'circle_membership__connection'
+
+    def post_users(self):
+        # Deleting a connection also deletes its opposite
+        opposites = self.values('opposite')
+        return super().post_users() | PostUser.objects.filter(
+            circle_membership__connection__in=opposites,
+        )
+
+class CircleQuerySet(FeedLinkedQuerySet):
+    post_user_lookup = 'post_circle__circle'
+
+class CircleMembershipQuerySet(FeedLinkedQuerySet):
+    post_user_lookup = 'circle_membership'
+
+class PostCircleQuerySet(FeedLinkedQuerySet):
+    post_user_lookup = 'post_circle'
+
+class ConnectionManager(models.Manager.from_queryset(ConnectionQuerySet)):
+    @transaction.atomic
+    def connect(self, owner, other_user, *, connection=None):
+        '''
+        Connects two users, returning owner's Connection; its `opposite` is
+        other_user's. Both rows are written in one INSERT: they reference
+        each other, which works because foreign keys are only checked when
+        the transaction commits.
+
+        The connection limit is enforced by incrementing both users'
+        `connection_count` in one UPDATE which skips users at the limit.
+        The UPDATE locks the rows, so concurrent connects can't both take
+        the last slot.
+
+        `connection` is an unsaved Connection to use for owner's side.
+        '''
+        if owner.pk == other_user.pk:
+            # Otherwise the UPDATE below would match one user, not two, and
+            # this would be reported as hitting the connection limit
+            raise ValueError('Users cannot connect with themselves')
+
+        if self.filter(owner=owner, other_user=other_user).exists():
+            raise AlreadyConnectedException('You are already connected')
+
+        incremented = User.objects.filter(
+            pk__in=(owner.pk, other_user.pk),
+            connection_count__lt=settings.MAX_CONNECTIONS_PER_USER,
+        ).update(connection_count=models.F('connection_count') + 1)
+
+        if incremented != 2:
+            # Raising rolls back the increment of the user under the limit
+            raise ConnectionLimitException('Connection limit reached')
+
+        if connection is None:
+            connection = self.model(owner=owner, other_user=other_user)
+
+        connection.opposite = self.model(
+            owner=other_user,
+            other_user=owner,
+            opposite=connection,
+        )
+
+        self.bulk_create([connection, connection.opposite])
+
+        # bulk_create doesn't send post_save to invalidate_connection_graph
+        graph.invalidate(owner.pk, other_user.pk)
+
+        return connection
+
 class Connection(models.Model):
     '''
     Every connection has an opposite connection, which is created on save.
@@ -415,6 +748,27 @@ class Connection(models.Model):
         through_fields=('connection', 'circle'),
     )
 
+    # These are maintained by Message.save and Connection.mark_read; run
+    # `manage.py reconcile_message_counts` if they drift.
+    message_count = models.PositiveIntegerField(
+        default=0,
+        help_text='Messages sent in either direction.',
+    )
+    unread_count = models.PositiveIntegerField(
+        default=0,
+        help_text='Incoming messages the owner has not read.',
+    )
+    last_message = models.ForeignKey(
+        'Message',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        help_text='The latest message sent in either direction.',
+    )
+
+    objects = ConnectionManager()
+
     class Meta:
         unique_together = (('owner', 'other_user'),)
 
@@ -428,6 +782,17 @@ class Connection(models.Model):
     def incoming_messages(self):
         return self.opposite.outgoing_messages.all()
 
+    @property
+    def conversation(self):
+        '''
+        Messages sent in either direction, as one queryset per direction for
+        `pagination.paginate()` and `pagination.since()` to merge.
+        '''
+        return [
+            Message.objects.filter(connection=self),
+            Message.objects.filter(connection=self.opposite_id),
+        ]
+
     @property
     def messages(self):
         return self.outgoing_messages.all().union(
@@ -436,34 +801,51 @@ class Connection(models.Model):
 
     @property
     def unread_message_count(self):
-        return self.incoming_messages.filter(is_read=False).count()
+        return self.unread_count
 
     @transaction.atomic
-    def save(self, *args, **kwargs):
-        if self.opposite is None:
-            assert self._state.adding
-            create_opposite = True
-        else:
-            create_opposite = False
+    def mark_read(self, messages=None):
+        '''
+        Marks incoming messages read: all of them, or only those in
+        `messages` if given.
+        '''
+        unread = self.incoming_messages.filter(is_read=False)
+
+        if messages is not None:
+            unread = unread.filter(
+                pk__in=[message.pk for message in messages],
+            )
 
-        existing_connection_count = self.owner.connections.count()
-        if self._state.adding:
-            if existing_connection_count >= settings.MAX_CONNECTIONS_PER_USER:
-                raise ConnectionLimitException()
+        marked = unread.update(is_read=True)
 
-        result = super().save(*args, **kwargs)
+        if marked:
+            # Subtract rather than zero, in case a message arrived after the
+            # update above, but never below zero if the count has drifted
+            Connection.objects.filter(pk=self.pk).update(
+                unread_count=Greatest(models.F('unread_count') - marked, 0),
+            )
+            self.refresh_from_db(fields=['unread_count'])
 
-        if create_opposite:
-            opposite = Connection(
-                opposite=self,
-                owner=self.other_user,
-                other_user=self.owner,
+        return marked
+
+    def save(self, *args, **kwargs):
+        if self._state.adding and self.opposite_id is None:
+            # New connections are always created along with their opposite
+            Connection.objects.connect(
+                self.owner,
+                self.other_user,
+                connection=self,
             )
-            opposite.save()
-            self.opposite = opposite
-            self.save()
+            return
 
-        return result
+        return super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        linked = Connection.objects.filter(pk=self.pk)
+
+        with transaction.atomic(savepoint=False):
+            with feed_cleanup(linked.post_users()):
+                return super().delete(*args, **kwargs)
 
 
 class UserConnection(models.Model):
@@ -491,6 +873,13 @@ class Circle(models.Model):
         max_length=16,
         validators=[validators.validate_color],
     )
+    backfill_post_count = models.PositiveIntegerField(
+        default=0,
+        help_text=(
+            'How many of the most recent posts in the circle a new member '
+            'can see. With 0, they only see posts made after they joined.'
+        ),
+    )
     owner = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
@@ -502,6 +891,8 @@ class Circle(models.Model):
         through_fields=('circle', 'connection'),
     )
 
+    objects = CircleQuerySet.as_manager()
+
     class Meta:
         unique_together = (('name', 'owner'),)
 
@@ -517,6 +908,13 @@ class Circle(models.Model):
     def get_absolute_url(self):
         return reverse('circle_detail', args=[str(self.pk)])
 
+    def delete(self, *args, **kwargs):
+        linked = Circle.objects.filter(pk=self.pk)
+
+        with transaction.atomic(savepoint=False):
+            with feed_cleanup(linked.post_users()):
+                return super().delete(*args, **kwargs)
+
     @property
     def members(self):
         return User.objects.filter(
@@ -525,7 +923,7 @@ class Circle(models.Model):
 
     @property
     def posts(self):
-        return Post.objects.filter(
+        return Post.objects.with_owner().filter(
             pk__in=PostCircle.objects.filter(circle=self).values_list(
                 'post',
                 flat=True,
@@ -533,7 +931,11 @@ class Circle(models.Model):
         )
 
 class CircleMembership(models.Model):
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    id = models.UUIDField(
+        primary_key=True,
+        default=uuids.uuid7,
+        editable=False,
+    )
     circle = models.ForeignKey(
         'Circle',
         on_delete=models.CASCADE,
@@ -545,6 +947,8 @@ class CircleMembership(models.Model):
         related_name='circle_memberships',
     )
 
+    objects = CircleMembershipQuerySet.as_manager()
+
     def __repr__(self):
         return "<CircleMembership: {} is a member of {}>".format(
             self.connection.other_user.display_name,
@@ -556,19 +960,133 @@ class CircleMembership(models.Model):
 
     def save(self, *args, **kwargs):
         assert self.circle.owner == self.connection.owner
-        return super().save(*args, **kwargs)
+        backfill = self._state.adding and self.circle.backfill_post_count
+
+        result = super().save(*args, **kwargs)
+
+        if backfill:
+            BackfillJob.enqueue([self.pk])
+
+        return result
+
+    def delete(self, *args, **kwargs):
+        linked = CircleMembership.objects.filter(pk=self.pk)
+
+        with transaction.atomic(savepoint=False):
+            with feed_cleanup(linked.post_users()):
+                return super().delete(*args, **kwargs)
+
+    @transaction.atomic
+    def backfill(self, limit, cursor=None):
+        '''
+        Gives the member up to `limit` of the circle's posts, newest first,
+        starting after `cursor`, and returns the cursor to continue from, or
+        None if there are no older posts. Each call reads one page of the
+        circle's PostCircles, so a large circle is backfilled a batch at a
+        time rather than all at once.
+        '''
+        page = pagination.paginate(
+            PostCircle.objects.filter(circle=self.circle_id),
+            cursor,
+            page_size=limit,
+        )
+
+        # Rows already written by a retried batch, or by a FanoutJob for a
+        # post published while the member was being added, are skipped
+        PostUser.objects.bulk_create(
+            [
+                PostUser(post_circle=post_circle, circle_membership=self)
+                for post_circle in page.object_list
+            ],
+            ignore_conflicts=True,
+        )
+        FeedEntry.objects.bulk_create(
+            [
+                FeedEntry(
+                    reader_id=self.connection.other_user_id,
+                    post_id=post_circle.post_id,
+                    created_utc=post_circle.created_utc,
+                )
+                for post_circle in page.object_list
+            ],
+            ignore_conflicts=True,
+        )
+
+        return page.older_cursor
 
 class Message(models.Model):
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    id = models.UUIDField(
+        primary_key=True,
+        default=uuids.uuid7,
+        editable=False,
+    )
     connection = models.ForeignKey(
         'Connection',
         on_delete=models.CASCADE,
         related_name='outgoing_messages',
+        # Covered by core_message_convo_created
+        db_index=False,
     )
     created_utc = models.DateTimeField(auto_now_add=True)
     is_read = models.BooleanField(default=False)
     text = models.CharField(max_length=1024)
 
+    class Meta:
+        indexes = (
+            # Paging through a conversation, see Connection.conversation.
+            # Including the pk means pages tied on created_utc aren't sorted
+            models.Index(
+                fields=('connection', '-created_utc', '-id'),
+                name='core_message_convo_created',
+            ),
+            # Only unread messages are looked up by is_read, and most
+            # messages have been read, so this only indexes unread ones
+            models.Index(
+                fields=('connection',),
+                condition=models.Q(is_read=False),
+                name='core_message_unread',
+            ),
+        )
+
+    @transaction.atomic
+    def save(self, *args, **kwargs):
+        count_message = self._state.adding
+
+        result = super().save(*args, **kwargs)
+
+        if count_message:
+            opposite_pk = self.connection.opposite_id
+
+            # A message saved concurrently may have a later created_utc but
+            # have been counted first; it stays the last message
+            newer = models.Q(created_utc__gt=self.created_utc)
+            newer |= models.Q(created_utc=self.created_utc, pk__gt=self.pk)
+            has_newer = models.Exists(Message.objects.filter(
+                newer,
+                pk=models.OuterRef('last_message'),
+            ))
+
+            Connection.objects.filter(
+                pk__in=(self.connection_id, opposite_pk),
+            ).update(
+                last_message=models.Case(
+                    models.When(has_newer, then=models.F('last_message')),
+                    default=models.Value(self.pk),
+                    output_field=models.UUIDField(),
+                ),
+                message_count=models.F('message_count') + 1,
+                unread_count=models.Case(
+                    models.When(
+                        pk=opposite_pk,
+                        then=models.F('unread_count') + 1,
+                    ),
+                    default=models.F('unread_count'),
+                    output_field=models.PositiveIntegerField(),
+                ),
+            )
+
+        return result
+
     @property
     def from_user(self):
         return self.connection.owner
@@ -577,6 +1095,34 @@ class Message(models.Model):
     def to_user(self):
         return self.connection.other_user
 
+class PostQuerySet(models.QuerySet):
+    # The owner fields needed to show who wrote a post, see widgets/posts.html
+    OWNER_FIELDS = (
+        'username',
+        'name',
+        'avatar',
+        'avatar_width',
+        'avatar_height',
+        'avatar_thumbnail_stem',
+        'avatar_pending',
+        'avatar_crop_x0',
+        'avatar_crop_x1',
+        'avatar_crop_y0',
+        'avatar_crop_y1',
+    )
+
+    def with_owner(self):
+        '''
+        Joins each post's owner, loading only the columns needed to list the
+        posts, so a page of posts is one query rather than one per post.
+        '''
+        return self.select_related('owner').only(
+            'created_utc',
+            'owner',
+            'text',
+            *('owner__{}'.format(field) for field in self.OWNER_FIELDS),
+        )
+
 class Post(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     created_utc = models.DateTimeField(auto_now_add=True)
@@ -584,6 +1130,8 @@ class Post(models.Model):
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
         related_name='posts',
+        # Covered by core_post_owner_created
+        db_index=False,
     )
     text = models.CharField(max_length=1024)
     circles = models.ManyToManyField(
@@ -591,9 +1139,111 @@ class Post(models.Model):
         related_name='+',
     )
 
-    def publish(self, *, circles):
-        for circle in circles:
-            PostCircle.objects.create(circle=circle, post=self)
+    objects = PostQuerySet.as_manager()
+
+    class Meta:
+        indexes = (
+            # A user's own posts, newest first, see User.feed_for_user
+            models.Index(
+                fields=('owner', '-created_utc'),
+                name='core_post_owner_created',
+            ),
+        )
+
+    @transaction.atomic
+    def save(self, *args, **kwargs):
+        create_feed_entry = self._state.adding
+
+        result = super().save(*args, **kwargs)
+
+        if create_feed_entry:
+            self.add_to_feeds([self.owner_id])
+
+        return result
+
+    @transaction.atomic
+    def publish(self, *, circles, defer=None):
+        '''
+        Publishes the post to `circles`. If `defer` is true (by default, if
+        settings.DEFER_FANOUT is set) this only records FanoutJobs, and
+        `manage.py run_fanout_worker` links the post to readers later.
+        '''
+        if defer is None:
+            defer = settings.DEFER_FANOUT
+
+        already_published = PostCircle.objects.filter(
+            post=self,
+        ).values_list('circle', flat=True)
+
+        circle_pks = (
+            set(circle.pk for circle in circles) - set(already_published)
+        )
+
+        post_circles = [
+            PostCircle(
+                circle_id=circle_pk,
+                post=self,
+                created_utc=self.created_utc,
+            )
+            for circle_pk in circle_pks
+        ]
+        PostCircle.objects.bulk_create(post_circles)
+
+        if defer:
+            FanoutJob.objects.bulk_create(
+                [
+                    FanoutJob(post_circle=post_circle)
+                    for post_circle in post_circles
+                ],
+                ignore_conflicts=True,
+            )
+        else:
+            self.link_to_readers(post_circles)
+
+    def link_to_readers(self, post_circles):
+        '''
+        Creates the PostUsers and FeedEntries for newly created PostCircles
+        of this post, reading every CircleMembership of every circle in one
+        query and writing rows in bulk.
+
+        A reader who is in more than one of the circles gets one PostUser
+        per circle, so removing them from one circle leaves the post visible
+        through the others, but only one FeedEntry.
+        '''
+        post_circles_by_circle = {
+            post_circle.circle_id: post_circle
+            for post_circle in post_circles
+        }
+
+        circle_memberships = CircleMembership.objects.filter(
+            circle__in=post_circles_by_circle.keys(),
+        ).values_list('pk', 'circle', 'connection__other_user')
+
+        post_users = []
+        reader_pks = set()
+
+        for cm_pk, circle_pk, reader_pk in circle_memberships:
+            post_users.append(PostUser(
+                post_circle=post_circles_by_circle[circle_pk],
+                circle_membership_id=cm_pk,
+            ))
+            reader_pks.add(reader_pk)
+
+        PostUser.objects.bulk_create(post_users, ignore_conflicts=True)
+        self.add_to_feeds(reader_pks)
+
+    def add_to_feeds(self, reader_pks):
+        FeedEntry.objects.bulk_create(
+            [
+                FeedEntry(
+                    reader_id=reader_pk,
+                    post=self,
+                    created_utc=self.created_utc,
+                )
+                for reader_pk in reader_pks
+            ],
+            ignore_conflicts=True,
+        )
 
     def get_absolute_url(self):
         return reverse('post_detail', args=[str(self.pk)])
@@ -602,7 +1252,11 @@ class Post(models.Model):
         return f"Post by {self.owner.display_name}"
 
 class PostCircle(models.Model):
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    id = models.UUIDField(
+        primary_key=True,
+        default=uuids.uuid7,
+        editable=False,
+    )
     circle = models.ForeignKey(
         'Circle',
         on_delete=models.CASCADE,
@@ -613,24 +1267,42 @@ class PostCircle(models.Model):
         on_delete=models.CASCADE,
         related_name='+',
     )
+    created_utc = models.DateTimeField(
+        help_text='Copied from the post, so backfills can page by index.',
+    )
+
+    objects = PostCircleQuerySet.as_manager()
 
     class Meta:
         unique_together = (('circle', 'post'),)
+        indexes = (
+            # A circle's posts, newest first, see CircleMembership.backfill
+            models.Index(
+                fields=('circle', '-created_utc', '-id'),
+                name='core_postcircle_circle_created',
+            ),
+        )
 
     def save(self, *args, **kwargs):
         link_to_users = self._state.adding
 
+        if self.created_utc is None:
+            self.created_utc = self.post.created_utc
+
         result = super().save(*args, **kwargs)
 
         if link_to_users:
-            for circle_membership in self.circle.circle_memberships.all():
-                PostUser.objects.create(
-                    post_circle=self,
-                    circle_membership=circle_membership,
-                )
+            self.post.link_to_readers([self])
 
         return result
 
+    def delete(self, *args, **kwargs):
+        linked = PostCircle.objects.filter(pk=self.pk)
+
+        with transaction.atomic(savepoint=False):
+            with feed_cleanup(linked.post_users()):
+                return super().delete(*args, **kwargs)
+
 
 class PostUser(models.Model):
     post_circle = models.ForeignKey(
@@ -643,3 +1315,232 @@ class PostUser(models.Model):
         on_delete=models.CASCADE,
         related_name='+',
     )
+
+    class Meta:
+        # A fanout job and a backfill job can both link a new member to a
+        # post; whichever runs second skips the rows the first wrote
+        constraints = (
+            models.UniqueConstraint(
+                fields=('post_circle', 'circle_membership'),
+                name='core_postuser_unique',
+            ),
+        )
+
+class FeedEntry(models.Model):
+    '''
+    A FeedEntry is a denormalized row saying that `post` appears in the feed
+    of `reader`. There is exactly one FeedEntry per (reader, post), no matter
+    how many circles the post reaches the reader through, so `User.feed` can
+    read a page of the feed without joining through Connection,
+    CircleMembership, PostUser and PostCircle.
+
+    FeedEntries are written by `Post.save` (for the post's owner) and
+    `PostCircle.save` (for the circle's members), and removed when the last
+    PostUser linking the reader to the post is deleted (see
+    FeedLinkedQuerySet). Run
+    `manage.py backfill_feed` to fill in FeedEntries for existing data.
+    '''
+    reader = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    post = models.ForeignKey(
+        'Post',
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+    )
+    created_utc = models.DateTimeField(
+        help_text='Copied from the post, so the feed can be sorted by index.',
+    )
+
+    class Meta:
+        unique_together = (('reader', 'post'),)
+        indexes = (
+            models.Index(
+                fields=('reader', '-created_utc'),
+                name='core_feedentry_reader_created',
+            ),
+        )
+
+class FanoutJob(models.Model):
+    '''
+    A FanoutJob records that a PostCircle has been created but its PostUsers
+    and FeedEntries have not been written yet. Jobs are run by
+    `manage.py run_fanout_worker` (see `core.fanout`).
+
+    `post_circle` is the job's idempotency key: enqueueing the same
+    PostCircle twice creates one job, and a job is deleted in the same
+    transaction that writes its PostUsers, so a job that is retried after a
+    failure never fans out twice.
+    '''
+    id = models.UUIDField(
+        primary_key=True,
+        default=uuids.uuid7,
+        editable=False,
+    )
+    post_circle = models.OneToOneField(
+        'PostCircle',
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    created_utc = models.DateTimeField(auto_now_add=True)
+    run_after = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = (
+            models.Index(
+                fields=('run_after',),
+                name='core_fanoutjob_run_after',
+            ),
+        )
+
+class BackfillJob(models.Model):
+    '''
+    A BackfillJob gives a new CircleMembership the `remaining` most recent
+    posts of a circle which has `backfill_post_count` set. Jobs are run a
+    batch of posts at a time by `manage.py run_fanout_worker`, which stores
+    where it got to in `cursor`, so adding someone to a circle with many
+    posts never reads all of them in one go.
+    '''
+    # How many posts a worker backfills before handing the job back
+    BATCH_SIZE = 100
+
+    id = models.UUIDField(
+        primary_key=True,
+        default=uuids.uuid7,
+        editable=False,
+    )
+    circle_membership = models.OneToOneField(
+        'CircleMembership',
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    remaining = models.PositiveIntegerField()
+    cursor = models.CharField(max_length=64, blank=True)
+    created_utc = models.DateTimeField(auto_now_add=True)
+    run_after = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = (
+            models.Index(
+                fields=('run_after',),
+                name='core_backfilljob_run_after',
+            ),
+        )
+
+    @classmethod
+    def enqueue(cls, membership_pks, *, defer=None):
+        '''
+        Backfills new CircleMemberships in circles which have
+        `backfill_post_count` set; others are skipped. If `defer` is true (by
+        default, if settings.DEFER_FANOUT is set) this only records
+        BackfillJobs for `manage.py run_fanout_worker`.
+        '''
+        if defer is None:
+            defer = settings.DEFER_FANOUT
+
+        memberships = CircleMembership.objects.filter(
+            pk__in=membership_pks,
+            circle__backfill_post_count__gt=0,
+        ).select_related('circle', 'connection')
+
+        jobs = [
+            cls(
+                circle_membership=membership,
+                remaining=membership.circle.backfill_post_count,
+            )
+            for membership in memberships
+        ]
+
+        if defer:
+            cls.objects.bulk_create(jobs, ignore_conflicts=True)
+        else:
+            for job in jobs:
+                while not job.run_batch():
+                    pass
+
+    def run_batch(self, batch_size=None):
+        '''
+        Backfills the next `batch_size` posts, returning True when the job
+        is finished. The caller saves or deletes the job.
+        '''
+        if batch_size is None:
+            batch_size = self.BATCH_SIZE
+
+        limit = min(batch_size, self.remaining)
+        cursor = self.circle_membership.backfill(limit, self.cursor or None)
+
+        self.remaining -= limit
+        self.cursor = cursor or ''
+
+        return cursor is None or self.remaining == 0
+
+@receiver(signals.post_save, sender=Connection)
+@receiver(signals.post_delete, sender=Connection)
+def invalidate_connection_graph(sender, instance, **kwargs):
+    graph.invalidate(instance.owner_id, instance.other_user_id)
+
+@receiver(signals.post_delete, sender=Connection)
+def decrement_connection_count(sender, instance, **kwargs):
+    User.objects.filter(
+        pk=instance.owner_id,
+        connection_count__gt=0,
+    ).update(connection_count=models.F('connection_count') - 1)
+
+@receiver(signals.post_save, sender=Intro)
+def remove_intro_suggestion(sender, instance, created, **kwargs):
+    if not created:
+        return
+
+    IntroSuggestion.objects.filter(
+        owner=instance.sender_id,
+        receiver__in=(instance.receiver_id, instance.introduced_id),
+        introduced__in=(instance.receiver_id, instance.introduced_id),
+    ).delete()
+
+@contextlib.contextmanager
+def feed_cleanup(post_users):
+    '''
+    Removes the FeedEntries which deleting `post_users`, a queryset of
+    PostUsers, inside the block leaves stale. PostUser has no delete
+    signal receivers, so the deletion itself stays a single statement.
+    '''
+    reader_pks = set()
+    post_pks = set()
+
+    for reader_pk, post_pk in post_users.values_list(
+        'circle_membership__connection__other_user',
+        'post_circle__post',
+    ):
+        reader_pks.add(reader_pk)
+        post_pks.add(post_pk)
+
+    yield
+
+    if post_pks:
+        remove_stale_feed_entries(reader_pks, post_pks)
+
+def remove_stale_feed_entries(reader_pks, post_pks):
+    '''
+    Deletes the FeedEntries of these readers for these posts which are no
+    longer visible to them through any PostUser, in one statement. Entries
+    for the readers' own posts are kept.
+    '''
+    still_visible = PostUser.objects.filter(
+        circle_membership__connection__other_user=models.OuterRef('reader'),
+        post_circle__post=models.OuterRef('post'),
+    )
+
+    FeedEntry.objects.filter(
+        reader__in=reader_pks,
+        post__in=post_pks,
+    ).exclude(
+        post__owner=models.F('reader'),
+    ).exclude(
+        models.Exists(still_visible),
+    ).delete()
@@ -0,0 +1,130 @@
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+import uuid
+
+from django.conf import settings
+from django.core.exceptions import BadRequest
+from django.db.models import Q, QuerySet
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+_Page = namedtuple(
+    'Page',
+    (
+        'object_list',
+        'older_cursor',
+        'newer_cursor',
+    ),
+    defaults=(None, None),
+)
+
+class Page(_Page):
+    @property
+    def has_older(self):
+        return self.older_cursor is not None
+
+def encode_cursor(created_utc, pk):
+    microseconds = (created_utc - EPOCH) // timedelta(microseconds=1)
+    return '{}.{}'.format(microseconds, pk.hex)
+
+# A cursor which sorts before every row, for polling an empty list
+START_CURSOR = encode_cursor(EPOCH, uuid.UUID(int=0))
+
+def decode_cursor(cursor):
+    try:
+        microseconds, pk = cursor.split('.')
+        created_utc = EPOCH + timedelta(microseconds=int(microseconds))
+        return created_utc, uuid.UUID(hex=pk)
+    except (ValueError, OverflowError):
+        raise BadRequest('Invalid cursor')
+
+def _ordered(queryset, condition, ordering):
+    '''
+    `queryset` filtered by `condition` and sorted by `ordering`. It can also
+    be a list of querysets, e.g. the two directions of a conversation, in
+    which case their UNION ALL is returned. Each part is filtered on its own,
+    so the database reads each from its own index and merges them in order,
+    rather than sorting every row matching an OR of them.
+    '''
+    if isinstance(queryset, QuerySet):
+        return queryset.filter(condition).order_by(*ordering)
+
+    first, *rest = [part.filter(condition).order_by() for part in queryset]
+    return first.union(*rest, all=True).order_by(*ordering)
+
+def newest_first(queryset, cursor=None, *, created_field='created_utc'):
+    '''
+    The rows of `queryset` older than `cursor`, newest first. See paginate().
+    '''
+    condition = Q()
+
+    if cursor:
+        created_utc, pk = decode_cursor(cursor)
+        older = Q(**{'{}__lt'.format(created_field): created_utc})
+        tied = Q(**{created_field: created_utc, 'pk__lt': pk})
+        condition = older | tied
+
+    ordering = ('-{}'.format(created_field), '-pk')
+    return _ordered(queryset, condition, ordering)
+
+def paginate(queryset, cursor=None, *, created_field='created_utc',
+             page_size=None):
+    '''
+    Returns a Page of `queryset`, newest first, starting after `cursor`.
+
+    Pages are keyed on (created, pk) rather than an OFFSET, so fetching page
+    1000 costs the same as fetching page 1: the database seeks straight to the
+    cursor in the index instead of counting past every newer row.
+    `created_field` can be an annotation, which lets `User.feed` page on the
+    indexed FeedEntry.created_utc column instead of Post.created_utc.
+    `queryset` can be a list of querysets to page through together.
+    '''
+    if page_size is None:
+        page_size = settings.FEED_PAGE_SIZE
+
+    queryset = newest_first(queryset, cursor, created_field=created_field)
+
+    # Fetch one extra row to find out whether there is an older page
+    object_list = list(queryset[:page_size + 1])
+
+    if len(object_list) > page_size:
+        object_list = object_list[:page_size]
+        older_cursor = cursor_for(object_list[-1], created_field)
+    else:
+        older_cursor = None
+
+    if object_list:
+        newer_cursor = cursor_for(object_list[0], created_field)
+    else:
+        newer_cursor = None
+
+    return Page(
+        object_list=object_list,
+        older_cursor=older_cursor,
+        newer_cursor=newer_cursor,
+    )
+
+def since(queryset, cursor, *, created_field='created_utc', page_size=None):
+    '''
+    Returns a Page of the rows of `queryset` newer than `cursor`, oldest
+    first, for polling. Pass the Page's `newer_cursor` to the next call.
+    '''
+    if page_size is None:
+        page_size = settings.FEED_PAGE_SIZE
+
+    created_utc, pk = decode_cursor(cursor)
+    newer = Q(**{'{}__gt'.format(created_field): created_utc})
+    tied = Q(**{created_field: created_utc, 'pk__gt': pk})
+
+    queryset = _ordered(queryset, newer | tied, (created_field, 'pk'))
+    object_list = list(queryset[:page_size])
+
+    if object_list:
+        newer_cursor = cursor_for(object_list[-1], created_field)
+    else:
+        newer_cursor = cursor
+
+    return Page(object_list=object_list, newer_cursor=newer_cursor)
+
+def cursor_for(obj, created_field='created_utc'):
+    return encode_cursor(getattr(obj, created_field), obj.pk)
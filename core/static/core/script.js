@@ -7,5 +7,134 @@
 })(function() {
   /* This code will be called on document ready. */
   console.log('This user has JavaScript enabled!');
-});
 
+  /*
+   * Load older posts in place instead of following the "older" link to a
+   * new page. The link still works without JS.
+   */
+  document.addEventListener('click', function(event) {
+    var link = event.target.closest('nav.older a[data-fragment-url]');
+
+    if (!link || !link.dataset.fragmentUrl) {
+      return;
+    }
+
+    event.preventDefault();
+
+    var url = link.dataset.fragmentUrl + '?before=' + link.dataset.cursor;
+
+    fetch(url, { credentials: 'same-origin' })
+      .then(function(response) { return response.json(); })
+      .then(function(data) {
+        var nav = link.closest('nav.older');
+        nav.insertAdjacentHTML('beforebegin', data.html);
+
+        if (data.older_cursor) {
+          link.dataset.cursor = data.older_cursor;
+          link.href = '?before=' + data.older_cursor;
+        } else {
+          nav.remove();
+        }
+      });
+  });
+
+  /*
+   * Poll for new messages in a conversation and append them, so sending or
+   * receiving a message doesn't reload the whole conversation.
+   */
+  var messages = document.querySelector('section.messages[data-since-url]');
+
+  if (!messages) {
+    return;
+  }
+
+  var POLL_INTERVAL = 5000;
+
+  /*
+   * Only one poll runs at a time, so two polls can't fetch the same
+   * since_url and append the same messages twice. A poll requested while
+   * one is running runs when it finishes, with the updated since_url.
+   */
+  var polling = null;
+  var pollAgain = false;
+  var pollTimer = null;
+
+  function pollMessages() {
+    if (polling) {
+      pollAgain = true;
+      return polling;
+    }
+
+    clearTimeout(pollTimer);
+
+    polling = fetch(messages.dataset.sinceUrl, { credentials: 'same-origin' })
+      .then(function(response) { return response.json(); })
+      .then(function(data) {
+        if (data.messages.length > 0) {
+          messages.insertAdjacentHTML('beforeend', data.html);
+          messages.lastElementChild.scrollIntoView();
+        }
+
+        messages.dataset.sinceUrl = data.since_url;
+      })
+      .catch(function(error) { console.error(error); })
+      .then(function() {
+        polling = null;
+
+        if (pollAgain) {
+          pollAgain = false;
+          return pollMessages();
+        }
+
+        pollTimer = setTimeout(pollMessages, POLL_INTERVAL);
+      });
+
+    return polling;
+  }
+
+  pollTimer = setTimeout(pollMessages, POLL_INTERVAL);
+
+  var form = document.querySelector('form.message-form');
+
+  function showSendError(text) {
+    var errors = form.querySelector('ul.errorlist.send-error');
+
+    if (!errors) {
+      errors = document.createElement('ul');
+      errors.className = 'errorlist send-error';
+      form.insertBefore(errors, form.firstChild);
+    }
+
+    errors.innerHTML = '';
+
+    if (text) {
+      var item = document.createElement('li');
+      item.textContent = text;
+      errors.appendChild(item);
+    }
+  }
+
+  form.addEventListener('submit', function(event) {
+    event.preventDefault();
+
+    fetch(form.action, {
+      method: 'POST',
+      body: new FormData(form),
+      credentials: 'same-origin',
+      redirect: 'manual',
+    }).then(function(response) {
+      // A successful send redirects, which `redirect: 'manual'` reports as
+      // an opaque redirect rather than following it. An invalid message
+      // re-renders the form with a 200, so that is a failure too.
+      if (response.type === 'opaqueredirect') {
+        showSendError(null);
+        form.reset();
+        return pollMessages();
+      }
+
+      showSendError('Your message could not be sent. Please try again.');
+    }, function() {
+      showSendError('Your message could not be sent. Please try again.');
+    });
+  });
+});
@@ -0,0 +1,39 @@
+from collections import namedtuple
+import functools
+import hashlib
+
+from django.conf import settings
+from django.template.loader import render_to_string
+
+Stylesheet = namedtuple('Stylesheet', ('css', 'digest'))
+
+@functools.lru_cache(maxsize=256)
+def render_stylesheet(foreground_color, background_color, error_color):
+    '''
+    Renders core/style.css once per distinct set of colors. The digest is a
+    hash of the rendered CSS, so it changes whenever the CSS does and can be
+    used in the stylesheet's URL.
+    '''
+    css = render_to_string('core/style.css', {
+        'colors': {
+            'foreground_color': foreground_color,
+            'background_color': background_color,
+            'error_color': error_color,
+        },
+    })
+    digest = hashlib.sha256(css.encode('utf-8')).hexdigest()[:16]
+    return Stylesheet(css=css, digest=digest)
+
+def stylesheet_for(user):
+    if settings.DEBUG:
+        # Pick up edits to the template during development
+        render_stylesheet.cache_clear()
+
+    if not user.is_authenticated:
+        return render_stylesheet('', '', '')
+
+    return render_stylesheet(
+        user.foreground_color,
+        user.background_color,
+        user.error_color,
+    )
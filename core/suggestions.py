@@ -0,0 +1,106 @@
+'''
+Suggests pairs of a user's connections who are not connected with each
+other, ranked by how many connections they have in common, for the user to
+introduce.
+
+Connections are limited to MAX_CONNECTIONS_PER_USER, so a user's
+neighborhood is at most 150 connections with 150 connections each, and
+every pair can be scored with set intersections over the cached neighbor
+sets in core/graph.py rather than with queries.
+'''
+import heapq
+
+from django.conf import settings
+from django.db import transaction
+
+from . import graph, models
+
+def suggest_intros(user_pk, limit=None):
+    '''
+    Returns up to `limit` (receiver pk, introduced pk, mutual count) triples
+    for the user, most mutual connections first. Pairs the user has already
+    introduced are skipped.
+    '''
+    if limit is None:
+        limit = settings.INTRO_SUGGESTION_COUNT
+
+    neighbors = sorted(graph.neighbors(user_pk))
+    neighbors_of = graph.neighbors_of_many(neighbors)
+
+    already_introduced = set(models.Intro.objects.filter(
+        sender=user_pk,
+    ).values_list('receiver', 'introduced'))
+
+    candidates = []
+
+    for i, receiver_pk in enumerate(neighbors):
+        receiver_neighbors = neighbors_of[receiver_pk]
+
+        for introduced_pk in neighbors[i + 1:]:
+            if introduced_pk in receiver_neighbors:
+                continue
+
+            if (receiver_pk, introduced_pk) in already_introduced:
+                continue
+
+            # The user is a connection of both, but doesn't count as one
+            # they have in common
+            introduced_neighbors = neighbors_of[introduced_pk]
+            mutual = receiver_neighbors & introduced_neighbors
+            mutual_count = len(mutual - {user_pk})
+            candidates.append((mutual_count, receiver_pk, introduced_pk))
+
+    return [
+        (receiver_pk, introduced_pk, mutual_count)
+        for mutual_count, receiver_pk, introduced_pk
+        in heapq.nlargest(limit, candidates)
+    ]
+
+@transaction.atomic
+def materialize(user_pk, limit=None):
+    '''
+    Replaces the user's stored IntroSuggestions, returning how many were
+    stored.
+    '''
+    suggestions = [
+        models.IntroSuggestion(
+            owner_id=user_pk,
+            receiver_id=receiver_pk,
+            introduced_id=introduced_pk,
+            mutual_count=mutual_count,
+        )
+        for receiver_pk, introduced_pk, mutual_count
+        in suggest_intros(user_pk, limit)
+    ]
+
+    models.IntroSuggestion.objects.filter(owner=user_pk).delete()
+    models.IntroSuggestion.objects.bulk_create(suggestions)
+    return len(suggestions)
+
+def current_suggestions(user):
+    '''
+    The user's stored suggestions, best first, leaving out pairs which have
+    been connected, or which the user has disconnected from, since they were
+    stored.
+    '''
+    stored = list(user.intro_suggestions.select_related(
+        'receiver',
+        'introduced',
+    ).order_by('-mutual_count', 'receiver', 'introduced'))
+
+    neighbors = graph.neighbors(user.pk)
+    neighbors_of = graph.neighbors_of_many(
+        {suggestion.receiver_id for suggestion in stored},
+    )
+
+    def is_current(suggestion):
+        if suggestion.receiver_id not in neighbors:
+            return False
+
+        if suggestion.introduced_id not in neighbors:
+            return False
+
+        receiver_neighbors = neighbors_of[suggestion.receiver_id]
+        return suggestion.introduced_id not in receiver_neighbors
+
+    return [suggestion for suggestion in stored if is_current(suggestion)]
@@ -0,0 +1,30 @@
+from django import template
+
+from .. import images
+
+register = template.Library()
+
+@register.filter
+def with_avatar_crop_styles(posts):
+    '''
+    Computes the avatar crop styles of the posts' owners in one batch, and
+    returns the posts. Each owner's style is computed once, however many of
+    the posts are theirs.
+    '''
+    posts = list(posts)
+    owners_by_pk = {}
+
+    for post in posts:
+        owners_by_pk.setdefault(post.owner_id, []).append(post.owner)
+
+    crops_by_pk = {
+        pk: owners[0].avatar_crop
+        for pk, owners in owners_by_pk.items()
+    }
+    styles = images.crop_styles(crops_by_pk.values())
+
+    for pk, owners in owners_by_pk.items():
+        for owner in owners:
+            owner.avatar_crop_style = styles[crops_by_pk[pk]]
+
+    return posts
@@ -1,3 +1,5 @@
+import functools
+
 from django import template
 from django.template.defaultfilters import stringfilter
 from django.utils.safestring import mark_safe
@@ -6,11 +8,19 @@ import markdown_it
 
 register = template.Library()
 
+RENDERER = markdown_it.MarkdownIt('js-default')
+
+@functools.lru_cache(maxsize=2048)
+def render(source):
+    '''
+    Renders markdown to HTML. This is cached by source, so a feed full of
+    posts which have been rendered before costs a dictionary lookup per post
+    rather than a parse.
+    '''
+    result = RENDERER.render(source)
+    return "<section class='markdown'>{}</section>".format(result)
+
 @register.filter(name='markdown')
 @stringfilter
 def render_markdown(source):
-    renderer = markdown_it.MarkdownIt('js-default')
-    result = renderer.render(source)
-    result = "<section class='markdown'>{}</section>".format(result)
-    result = mark_safe(result)
-    return result
+    return mark_safe(render(source))
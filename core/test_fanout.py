@@ -0,0 +1,184 @@
+import io
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TransactionTestCase, override_settings
+
+from . import fanout, memberships, models
+
+class FanoutTests(TransactionTestCase):
+    def setUp(self):
+        self.posting_user = models.User.objects.create_user(
+            username='posting_user',
+            password='12345',
+        )
+        self.reading_user = models.User.objects.create_user(
+            username='reading_user',
+            password='12345',
+        )
+
+        invitation = self.posting_user.create_invitation(
+            circles=self.posting_user.circles.all(),
+        )
+        self.reading_user.accept_invitation(
+            invitation,
+            circles=self.reading_user.circles.filter(name='Friends'),
+        )
+
+        self.post = models.Post.objects.create(
+            owner=self.posting_user,
+            text='Hello, world',
+        )
+
+    def test_deferred_publish_only_queues_jobs(self):
+        self.post.publish(circles=self.posting_user.circles.all(), defer=True)
+
+        self.assertEqual(models.FanoutJob.objects.count(), 2)
+        self.assertEqual(models.PostUser.objects.count(), 0)
+        self.assertNotIn(self.post, self.reading_user.feed.all())
+
+    @override_settings(DEFER_FANOUT=True)
+    def test_defer_fanout_setting(self):
+        self.post.publish(circles=self.posting_user.circles.all())
+
+        self.assertEqual(models.FanoutJob.objects.count(), 2)
+
+    def test_drain_delivers_post(self):
+        self.post.publish(circles=self.posting_user.circles.all(), defer=True)
+
+        self.assertEqual(fanout.drain(), 2)
+
+        self.assertEqual(models.FanoutJob.objects.count(), 0)
+        self.assertEqual(models.PostUser.objects.count(), 2)
+        self.assertEqual(list(self.reading_user.feed.all()), [self.post])
+
+    def test_publishing_twice_queues_one_job_per_circle(self):
+        circles = self.posting_user.circles.all()
+        self.post.publish(circles=circles, defer=True)
+        self.post.publish(circles=circles, defer=True)
+
+        self.assertEqual(models.FanoutJob.objects.count(), 2)
+
+    def test_failed_job_is_retried_later(self):
+        self.post.publish(
+            circles=self.posting_user.circles.filter(name='Friends'),
+            defer=True,
+        )
+
+        with mock.patch.object(
+            models.Post,
+            'link_to_readers',
+            side_effect=Exception('Database went away'),
+        ):
+            self.assertEqual(fanout.drain(), 0)
+
+        job = models.FanoutJob.objects.get()
+        self.assertEqual(job.attempts, 1)
+        self.assertIn('Database went away', job.last_error)
+        self.assertEqual(models.PostUser.objects.count(), 0)
+
+        models.FanoutJob.objects.update(run_after=job.created_utc)
+        fanout.drain()
+
+        self.assertEqual(models.PostUser.objects.count(), 1)
+
+    def test_deleted_post_circle_deletes_job(self):
+        self.post.publish(circles=self.posting_user.circles.all(), defer=True)
+
+        self.post.delete()
+
+        self.assertEqual(models.FanoutJob.objects.count(), 0)
+
+    def test_worker_command_once(self):
+        self.post.publish(circles=self.posting_user.circles.all(), defer=True)
+
+        call_command('run_fanout_worker', once=True, stdout=io.StringIO())
+
+        self.assertIn(self.post, self.reading_user.feed.all())
+
+@override_settings(DEFER_FANOUT=True)
+class BackfillJobTests(TransactionTestCase):
+    def setUp(self):
+        self.posting_user = models.User.objects.create_user(
+            username='posting_user',
+            password='12345',
+        )
+        self.reading_user = models.User.objects.create_user(
+            username='reading_user',
+            password='12345',
+        )
+        self.friends = self.posting_user.circles.get(name='Friends')
+        self.friends.backfill_post_count = 3
+        self.friends.save()
+
+        self.posts = []
+
+        for i in range(5):
+            post = models.Post.objects.create(
+                owner=self.posting_user,
+                text='Post {}'.format(i),
+            )
+            post.publish(circles=[self.friends], defer=False)
+            self.posts.append(post)
+
+        invitation = self.posting_user.create_invitation(
+            circles=self.posting_user.circles.filter(name='Friends'),
+        )
+        self.reading_user.accept_invitation(
+            invitation,
+            circles=self.reading_user.circles.filter(name='Friends'),
+        )
+
+    def test_adding_member_only_queues_job(self):
+        job = models.BackfillJob.objects.get()
+
+        self.assertEqual(job.remaining, 3)
+        self.assertFalse(self.reading_user.feed.exists())
+
+    def test_drain_backfills_in_batches(self):
+        with mock.patch.object(models.BackfillJob, 'BATCH_SIZE', 2):
+            self.assertEqual(fanout.run_pending(), 1)
+
+            job = models.BackfillJob.objects.get()
+            self.assertEqual(job.remaining, 1)
+            self.assertEqual(
+                list(self.reading_user.feed.all()),
+                self.posts[:2:-1],
+            )
+
+            self.assertEqual(fanout.drain(), 1)
+
+        self.assertFalse(models.BackfillJob.objects.exists())
+        self.assertEqual(
+            list(self.reading_user.feed.all()),
+            self.posts[:1:-1],
+        )
+
+    def test_failed_job_is_retried_later(self):
+        with mock.patch.object(
+            models.CircleMembership,
+            'backfill',
+            side_effect=Exception('Database went away'),
+        ):
+            self.assertEqual(fanout.drain(), 0)
+
+        job = models.BackfillJob.objects.get()
+        self.assertEqual(job.attempts, 1)
+        self.assertIn('Database went away', job.last_error)
+
+        models.BackfillJob.objects.update(run_after=job.created_utc)
+        fanout.drain()
+
+        self.assertEqual(self.reading_user.feed.count(), 3)
+
+    def test_bulk_added_members_are_queued(self):
+        models.BackfillJob.objects.all().delete()
+        models.CircleMembership.objects.filter(circle=self.friends).delete()
+        connection = models.Connection.objects.get(owner=self.posting_user)
+
+        memberships.update(
+            connection.circle_memberships.all(),
+            {(self.friends.pk, connection.pk)},
+        )
+
+        self.assertEqual(models.BackfillJob.objects.get().remaining, 3)
@@ -26,3 +26,63 @@ class InvitationFormTests(TestCase):
             invitation.circles.all(),
         )
         self.assertEqual(invitation.circles.count(), 1)
+
+class ProfileFormTests(TestCase):
+    def setUp(self):
+        self.user = models.User.objects.create_user(
+            username='testuser',
+            password='12345',
+            avatar='cat.png',
+            avatar_width=300,
+            avatar_height=200,
+        )
+
+    def make_form(self, x0, x1, y0, y1):
+        return forms.ProfileForm(
+            instance=self.user,
+            data={
+                'name': '',
+                'avatar_crop_x0': x0,
+                'avatar_crop_x1': x1,
+                'avatar_crop_y0': y0,
+                'avatar_crop_y1': y1,
+            },
+        )
+
+    def test_crop_is_saved(self):
+        form = self.make_form(0, 200, 0, 200)
+
+        self.assertTrue(form.is_valid(), form.errors)
+        form.save()
+
+        self.user.refresh_from_db()
+        self.assertEqual(
+            tuple(self.user.avatar_crop),
+            (300, 200, 0, 200, 0, 200),
+        )
+
+    def test_blank_crop_is_centered(self):
+        form = self.make_form('', '', '', '')
+
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(
+            tuple(form.save().avatar_crop),
+            (300, 200, 50, 250, 0, 200),
+        )
+
+    def test_partial_crop_is_invalid(self):
+        self.assertFalse(self.make_form(0, 200, '', '').is_valid())
+
+    def test_crop_outside_avatar_is_invalid(self):
+        self.assertFalse(self.make_form(200, 400, 0, 200).is_valid())
+
+    def test_crop_must_be_square(self):
+        self.assertFalse(self.make_form(0, 100, 0, 200).is_valid())
+
+    def test_crop_must_not_be_empty(self):
+        self.assertFalse(self.make_form(100, 100, 0, 0).is_valid())
+
+    def test_pending_avatar_cannot_be_cropped(self):
+        self.user.avatar_pending = True
+
+        self.assertFalse(self.make_form(0, 200, 0, 200).is_valid())
@@ -0,0 +1,73 @@
+from django.core.cache import cache
+from django.test import TestCase
+
+from . import graph, models
+
+class ConnectionGraphTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = models.User.objects.create(username='alice')
+        self.bob = models.User.objects.create(username='bob')
+        self.carol = models.User.objects.create(username='carol')
+
+    def test_neighbors(self):
+        models.Connection.objects.create(
+            owner=self.alice,
+            other_user=self.bob,
+        )
+
+        self.assertEqual(graph.neighbors(self.alice.pk), {self.bob.pk})
+        self.assertEqual(graph.neighbors(self.bob.pk), {self.alice.pk})
+        self.assertEqual(graph.neighbors(self.carol.pk), frozenset())
+
+    def test_neighbors_are_cached(self):
+        graph.neighbors(self.alice.pk)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(graph.neighbors(self.alice.pk), frozenset())
+
+    def test_neighbors_of_many_loads_in_one_query(self):
+        with self.assertNumQueries(1):
+            result = graph.neighbors_of_many([
+                self.alice.pk,
+                self.bob.pk,
+                self.carol.pk,
+            ])
+
+        self.assertEqual(len(result), 3)
+
+    def test_connecting_invalidates(self):
+        self.assertEqual(graph.neighbors(self.alice.pk), frozenset())
+
+        models.Connection.objects.create(
+            owner=self.alice,
+            other_user=self.bob,
+        )
+
+        self.assertEqual(graph.neighbors(self.alice.pk), {self.bob.pk})
+        self.assertEqual(graph.neighbors(self.bob.pk), {self.alice.pk})
+
+    def test_disconnecting_invalidates(self):
+        models.Connection.objects.create(
+            owner=self.alice,
+            other_user=self.bob,
+        )
+        self.assertEqual(graph.neighbors(self.alice.pk), {self.bob.pk})
+
+        models.Connection.objects.filter(owner=self.alice).delete()
+
+        self.assertEqual(graph.neighbors(self.alice.pk), frozenset())
+        self.assertEqual(graph.neighbors(self.bob.pk), frozenset())
+
+    def test_access_checks_ignore_stale_cache(self):
+        # As another process would see it before its cache entry expires
+        models.Connection.objects.create(
+            owner=self.alice,
+            other_user=self.bob,
+        )
+        graph.neighbors(self.alice.pk)
+        models.Connection.objects.filter(owner=self.alice).delete()
+        cache.set(graph.cache_key(self.alice.pk), frozenset([self.bob.pk]))
+
+        self.assertFalse(self.alice.is_connected_with(self.bob))
+        self.assertNotIn(self.bob, self.alice.connected_users)
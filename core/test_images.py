@@ -1,6 +1,12 @@
+import io
+import unittest
+from unittest import mock
+
 from django.test import TestCase
+from PIL import Image, features
 
-from . import images
+from . import images, models
+from .templatetags import avatars
 
 class ApplyCropTests(TestCase):
     def test_apply_top(self):
@@ -99,3 +105,216 @@ class ShowCropTests(TestCase):
         )
 
         self.assertEqual(crop.show_height, 50)
+
+class ThumbnailTests(TestCase):
+    def test_make_thumbnails_are_square_and_cropped(self):
+        # Left half red, right half blue; crop to the blue half
+        image = Image.new('RGB', (200, 100), 'red')
+        image.paste('blue', (100, 0, 200, 100))
+        crop = images.ImageCrop(
+            image_width=200,
+            image_height=100,
+            x0=100,
+            x1=200,
+            y0=0,
+            y1=100,
+        )
+
+        thumbnails = images.make_thumbnails(image, crop, sizes=(80, 160))
+
+        self.assertEqual(set(thumbnails), {80, 160})
+
+        for size, content in thumbnails.items():
+            with Image.open(io.BytesIO(content)) as thumbnail:
+                self.assertEqual(thumbnail.size, (size, size))
+                red, green, blue = thumbnail.convert('RGB').getpixel((0, 0))
+                self.assertGreater(blue, red)
+
+    def test_thumbnail_key_depends_on_crop(self):
+        crop = images.ImageCrop(
+            image_width=200,
+            image_height=100,
+            x0=50,
+            x1=150,
+            y0=0,
+            y1=100,
+        )
+
+        self.assertNotEqual(
+            images.thumbnail_key(b'image', crop),
+            images.thumbnail_key(b'image', crop._replace(x0=0, x1=100)),
+        )
+
+    def test_thumbnail_name_is_next_to_original(self):
+        stem = images.thumbnail_stem('avatars/cat.png', 'abc', 'jpg')
+
+        self.assertEqual(stem, 'avatars/cat.abc.jpg')
+        self.assertEqual(
+            images.thumbnail_name(stem, 80),
+            'avatars/cat.abc.80.jpg',
+        )
+
+    def make_transparent_thumbnail(self):
+        # Transparent, with an opaque blue square in the middle
+        image = Image.new('RGBA', (100, 100), (0, 0, 0, 0))
+        image.paste((0, 0, 255, 255), (25, 25, 75, 75))
+
+        thumbnails = images.make_thumbnails(
+            image,
+            images.centered_crop(100, 100),
+            sizes=(80,),
+        )
+
+        return Image.open(io.BytesIO(thumbnails[80]))
+
+    @unittest.skipUnless(features.check('webp'), 'WebP is not supported')
+    def test_webp_thumbnails_keep_transparency(self):
+        with self.make_transparent_thumbnail() as thumbnail:
+            self.assertEqual(thumbnail.format, 'WEBP')
+            self.assertEqual(thumbnail.mode, 'RGBA')
+            self.assertEqual(thumbnail.getpixel((0, 0))[3], 0)
+
+    def test_jpeg_thumbnails_are_flattened_onto_white(self):
+        with mock.patch.object(
+            images,
+            'thumbnail_format',
+            return_value=('JPEG', 'jpg'),
+        ):
+            thumbnail = self.make_transparent_thumbnail()
+
+        with thumbnail:
+            self.assertEqual(thumbnail.format, 'JPEG')
+            red, green, blue = thumbnail.getpixel((0, 0))
+            self.assertGreater(min(red, green, blue), 240)
+
+            red, green, blue = thumbnail.getpixel((40, 40))
+            self.assertGreater(blue, red)
+
+class ProcessImageTests(TestCase):
+    def make_jpeg(self, size, orientation):
+        exif = Image.Exif()
+        exif[0x0112] = orientation
+        exif[0x010f] = 'Test Camera'
+
+        buffer = io.BytesIO()
+        Image.new('RGB', size, 'red').save(buffer, format='JPEG', exif=exif)
+        return buffer.getvalue()
+
+    def test_centered_crop(self):
+        self.assertEqual(
+            tuple(images.centered_crop(300, 200)),
+            (300, 200, 50, 250, 0, 200),
+        )
+        self.assertEqual(
+            tuple(images.centered_crop(200, 300)),
+            (200, 300, 0, 200, 50, 250),
+        )
+
+    def test_orientation_is_applied_and_exif_stripped(self):
+        # Orientation 6 means the camera was rotated, so the stored 300x200
+        # image is displayed as 200x300
+        processed = images.process_image(self.make_jpeg((300, 200), 6))
+
+        self.assertEqual(processed.extension, 'jpg')
+        self.assertEqual(tuple(processed.crop)[:2], (200, 300))
+
+        with Image.open(io.BytesIO(processed.data)) as image:
+            self.assertEqual(image.size, (200, 300))
+            self.assertEqual(len(image.getexif()), 0)
+
+    def test_thumbnails_are_generated(self):
+        processed = images.process_image(
+            self.make_jpeg((300, 200), 1),
+            sizes=(80,),
+        )
+
+        self.assertEqual(set(processed.thumbnails), {80})
+
+    def test_unusual_formats_become_png(self):
+        buffer = io.BytesIO()
+        Image.new('RGB', (10, 10), 'red').save(buffer, format='BMP')
+
+        processed = images.process_image(buffer.getvalue(), sizes=())
+
+        self.assertEqual(processed.extension, 'png')
+
+        with Image.open(io.BytesIO(processed.data)) as image:
+            self.assertEqual(image.format, 'PNG')
+
+    def test_cmyk_upload_is_converted(self):
+        # Pillow can't write CMYK as PNG, which TIFF falls back to
+        buffer = io.BytesIO()
+        Image.new('CMYK', (30, 20), (0, 255, 255, 0)).save(
+            buffer,
+            format='TIFF',
+        )
+
+        processed = images.process_image(buffer.getvalue(), sizes=(80,))
+
+        self.assertEqual(processed.extension, 'png')
+
+        with Image.open(io.BytesIO(processed.data)) as image:
+            self.assertEqual(image.mode, 'RGB')
+            self.assertEqual(image.getpixel((0, 0)), (255, 0, 0))
+
+    def test_transparency_is_kept(self):
+        buffer = io.BytesIO()
+        Image.new('LA', (10, 10), (0, 0)).save(buffer, format='PNG')
+
+        processed = images.process_image(buffer.getvalue(), sizes=())
+
+        with Image.open(io.BytesIO(processed.data)) as image:
+            self.assertEqual(image.mode, 'RGBA')
+            self.assertEqual(image.getpixel((0, 0))[3], 0)
+
+class CropStyleTests(TestCase):
+    def setUp(self):
+        images.crop_style.cache_clear()
+
+    def test_crop_style(self):
+        crop = images.centered_crop(300, 150)
+
+        self.assertEqual(
+            images.crop_style(crop).apply,
+            'left: -50.0%; top: 0.0%; width: 200.0%; height: 100.0%;',
+        )
+        self.assertEqual(
+            images.crop_style(crop).show,
+            'left: 25.0%; top: 0.0%; width: 50.0%; height: 100.0%;',
+        )
+
+    def test_empty_crop_has_no_style(self):
+        self.assertIsNone(images.crop_style(images.centered_crop(0, 0)))
+
+    def test_crop_styles_computes_each_crop_once(self):
+        crops = [
+            images.centered_crop(300, 200),
+            images.centered_crop(300, 200),
+            images.centered_crop(200, 300),
+        ]
+
+        styles = images.crop_styles(crops)
+
+        self.assertEqual(len(styles), 2)
+        self.assertEqual(images.crop_style.cache_info().misses, 2)
+
+    def test_posts_by_same_owner_share_style(self):
+        owner = models.User(avatar_width=300, avatar_height=200)
+        other_owner = models.User(avatar_width=300, avatar_height=200)
+        posts = [
+            models.Post(owner=owner),
+            models.Post(owner=models.User(
+                pk=owner.pk,
+                avatar_width=300,
+                avatar_height=200,
+            )),
+            models.Post(owner=other_owner),
+        ]
+
+        posts = avatars.with_avatar_crop_styles(posts)
+
+        self.assertIs(
+            posts[0].owner.avatar_crop_style,
+            posts[1].owner.avatar_crop_style,
+        )
+        self.assertEqual(images.crop_style.cache_info().misses, 1)
@@ -0,0 +1,83 @@
+from django.db import connection as db_connection
+from django.test import TestCase
+
+from . import models, pagination
+
+class IndexUsageTests(TestCase):
+    '''
+    Reads the query plans of the busiest queries to check that they are
+    answered from an index rather than by scanning the table.
+    '''
+    def setUp(self):
+        self.owner = models.User.objects.create(username='owner')
+        self.reader = models.User.objects.create(username='reader')
+        self.connection = models.Connection.objects.create(
+            owner=self.owner,
+            other_user=self.reader,
+        )
+
+        if db_connection.vendor == 'postgresql':
+            # The test tables are tiny, so PostgreSQL would rightly choose a
+            # sequential scan; turning those off checks an index can be used
+            with db_connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+
+    def assertUsesIndex(self, queryset, index_name):
+        # SQLite plans say "SEARCH core_post USING INDEX <name>", PostgreSQL
+        # plans "Index Scan using <name>" or "Bitmap Index Scan on <name>"
+        self.assertIn(index_name, queryset.explain())
+
+    def assertNotSorted(self, queryset):
+        # Rows are read in order from the index, rather than collected and
+        # sorted: SQLite sorts in a "TEMP B-TREE", PostgreSQL in a "Sort" or
+        # "Incremental Sort" node
+        plan = queryset.explain()
+
+        if db_connection.vendor == 'postgresql':
+            self.assertNotIn('Sort', plan)
+        else:
+            self.assertNotIn('TEMP B-TREE', plan)
+
+    def page(self, queryset, created_field='created_utc'):
+        # The query pagination.paginate() runs
+        return pagination.newest_first(
+            queryset,
+            created_field=created_field,
+        )[:21]
+
+    def test_feed(self):
+        self.assertUsesIndex(
+            self.page(self.reader.feed, 'feed_created_utc'),
+            'core_feedentry_reader_created',
+        )
+
+    def test_own_posts(self):
+        self.assertUsesIndex(
+            self.page(self.owner.feed_for_user(self.owner)),
+            'core_post_owner_created',
+        )
+
+    def test_circle_backfill(self):
+        circle = self.owner.circles.get(name='Friends')
+        page = self.page(models.PostCircle.objects.filter(circle=circle))
+
+        self.assertUsesIndex(page, 'core_postcircle_circle_created')
+        self.assertNotSorted(page)
+
+    def test_conversation(self):
+        page = self.page(self.connection.conversation)
+
+        self.assertUsesIndex(page, 'core_message_convo_created')
+        self.assertNotSorted(page)
+
+    def test_unread_messages(self):
+        self.assertUsesIndex(
+            self.connection.incoming_messages.filter(is_read=False),
+            'core_message_unread',
+        )
+
+    def test_invitations(self):
+        self.assertUsesIndex(
+            self.owner.invitations.order_by('name'),
+            'core_invitation_owner_name',
+        )
@@ -0,0 +1,16 @@
+from django.test import TestCase
+
+from .templatetags import markdown
+
+class RenderMarkdownTests(TestCase):
+    def test_render_markdown(self):
+        self.assertEqual(
+            markdown.render_markdown('*Hello*'),
+            "<section class='markdown'><p><em>Hello</em></p>\n</section>",
+        )
+
+    def test_render_markdown_escapes_html(self):
+        self.assertNotIn(
+            '<script>',
+            markdown.render_markdown('<script>alert(1)</script>'),
+        )
@@ -0,0 +1,96 @@
+from django.core.cache import cache
+from django.db import connection as db_connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from . import memberships, models
+
+class MembershipUpdateTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = models.User.objects.create(username='owner')
+        self.reader = models.User.objects.create(username='reader')
+        self.connection = models.Connection.objects.create(
+            owner=self.owner,
+            other_user=self.reader,
+        )
+        self.family = self.owner.circles.get(name='Family')
+        self.friends = self.owner.circles.get(name='Friends')
+
+    def update(self, *circles):
+        return memberships.update(
+            self.connection.circle_memberships.all(),
+            {(circle.pk, self.connection.pk) for circle in circles},
+        )
+
+    def publish(self, *circles):
+        post = models.Post.objects.create(owner=self.owner, text='Hello')
+        post.publish(circles=circles)
+        return post
+
+    def test_update_adds_and_removes(self):
+        self.assertEqual(self.update(self.family), (1, 0))
+        self.assertEqual(self.update(self.friends), (1, 1))
+        self.assertEqual(self.update(self.friends), (0, 0))
+
+        self.assertEqual(
+            list(self.connection.circles.all()),
+            [self.friends],
+        )
+
+    def test_removing_member_removes_posts_from_feed(self):
+        self.update(self.family, self.friends)
+        family_post = self.publish(self.family)
+        shared_post = self.publish(self.family, self.friends)
+        own_post = models.Post.objects.create(owner=self.reader, text='Hi')
+
+        self.update(self.friends)
+
+        self.assertEqual(
+            set(self.reader.feed),
+            {shared_post, own_post},
+        )
+        self.assertIn(family_post, self.owner.feed)
+
+    def count_removal_statements(self, post_count):
+        reader = models.User.objects.create(
+            username='reader{}'.format(post_count),
+        )
+        connection = models.Connection.objects.create(
+            owner=self.owner,
+            other_user=reader,
+        )
+        memberships.update(
+            connection.circle_memberships.all(),
+            {(self.family.pk, connection.pk)},
+        )
+
+        for _ in range(post_count):
+            self.publish(self.family)
+
+        with CaptureQueriesContext(db_connection) as queries:
+            memberships.update(connection.circle_memberships.all(), set())
+
+        self.assertFalse(reader.feed.exists())
+        return len(queries)
+
+    def test_statement_count_does_not_grow_with_posts(self):
+        # The savepoint, the read, reading the linked PostUsers, reading the
+        # memberships to delete, three DELETEs for them and the PostUsers and
+        # BackfillJobs cascading from them, the feed cleanup and the release
+        self.assertEqual(self.count_removal_statements(1), 9)
+        self.assertEqual(self.count_removal_statements(20), 9)
+
+    def test_edit_connection_circles_view(self):
+        self.client.force_login(self.owner)
+
+        url = reverse(
+            'edit_connection_circles',
+            kwargs={ 'pk': self.reader.pk },
+        )
+
+        response = self.client.post(url, {'circles': [str(self.family.pk)]})
+
+        self.assertRedirects(response, self.reader.get_absolute_url())
+        self.assertEqual(list(self.connection.circles.all()), [self.family])
@@ -0,0 +1,169 @@
+from datetime import datetime, timedelta, timezone
+import uuid
+
+from django.core.exceptions import BadRequest
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from . import models, pagination
+
+class CursorTests(TestCase):
+    def test_cursor_round_trip(self):
+        created_utc = datetime(2024, 2, 19, 22, 50, 1, 123456, timezone.utc)
+        pk = uuid.uuid4()
+
+        cursor = pagination.encode_cursor(created_utc, pk)
+
+        self.assertEqual(
+            pagination.decode_cursor(cursor),
+            (created_utc, pk),
+        )
+
+    def test_decode_invalid_cursor(self):
+        with self.assertRaises(BadRequest):
+            pagination.decode_cursor('not-a-cursor')
+
+@override_settings(FEED_PAGE_SIZE=2)
+class PaginateFeedTests(TestCase):
+    def setUp(self):
+        self.user = models.User.objects.create_user(
+            username='user',
+            password='12345',
+        )
+        self.posts = [
+            models.Post.objects.create(owner=self.user, text=str(i))
+            for i in range(5)
+        ]
+        self.posts.reverse()
+
+    def test_pages_cover_feed_once_newest_first(self):
+        seen = []
+        cursor = None
+
+        while True:
+            page = pagination.paginate(
+                self.user.feed,
+                cursor,
+                created_field='feed_created_utc',
+            )
+            seen.extend(page.object_list)
+
+            if not page.has_older:
+                break
+
+            cursor = page.older_cursor
+
+        self.assertEqual(seen, self.posts)
+
+    def test_pages_break_ties_on_pk(self):
+        models.Post.objects.update(created_utc=self.posts[0].created_utc)
+        models.FeedEntry.objects.update(
+            created_utc=self.posts[0].created_utc,
+        )
+
+        first = pagination.paginate(self.user.posts.all())
+        second = pagination.paginate(
+            self.user.posts.all(),
+            first.older_cursor,
+        )
+
+        self.assertEqual(len(second.object_list), 2)
+        self.assertFalse(
+            set(first.object_list) & set(second.object_list),
+        )
+
+    def test_index_shows_older_link(self):
+        self.client.login(username='user', password='12345')
+
+        response = self.client.get(reverse('index'))
+
+        self.assertEqual(
+            list(response.context['feed_page'].object_list),
+            self.posts[:2],
+        )
+        self.assertContains(response, '?before=')
+
+    def test_feed_fragment_returns_next_page(self):
+        self.client.login(username='user', password='12345')
+        first = pagination.paginate(
+            self.user.feed,
+            created_field='feed_created_utc',
+        )
+
+        response = self.client.get(
+            reverse('index_feed'),
+            { 'before': first.older_cursor },
+        )
+        data = response.json()
+
+        self.assertIn(self.posts[2].get_absolute_url(), data['html'])
+        self.assertIn(self.posts[3].get_absolute_url(), data['html'])
+        self.assertNotIn(self.posts[1].get_absolute_url(), data['html'])
+        self.assertIsNotNone(data['older_cursor'])
+
+    def test_profile_feed_fragment_returns_next_page(self):
+        self.client.login(username='user', password='12345')
+        first = pagination.paginate(self.user.feed_for_user(self.user))
+
+        response = self.client.get(
+            reverse('profile_feed'),
+            { 'before': first.older_cursor },
+        )
+        data = response.json()
+
+        self.assertIn(self.posts[2].get_absolute_url(), data['html'])
+        self.assertNotIn(self.posts[1].get_absolute_url(), data['html'])
+
+    def test_feed_fragment_rejects_invalid_cursor(self):
+        self.client.login(username='user', password='12345')
+
+        response = self.client.get(reverse('index_feed'), { 'before': 'x' })
+
+        self.assertEqual(response.status_code, 400)
+
+class PaginateConversationTests(TestCase):
+    def setUp(self):
+        self.alice = models.User.objects.create(username='alice')
+        self.bob = models.User.objects.create(username='bob')
+        self.connection = models.Connection.objects.create(
+            owner=self.alice,
+            other_user=self.bob,
+        )
+        self.messages = [
+            sender.send_message_to(receiver, text=str(i))
+            for i, (sender, receiver) in enumerate([
+                (self.alice, self.bob),
+                (self.bob, self.alice),
+                (self.bob, self.alice),
+                (self.alice, self.bob),
+                (self.bob, self.alice),
+            ])
+        ]
+
+    def test_pages_merge_both_directions_newest_first(self):
+        seen = []
+        cursor = None
+
+        while True:
+            page = pagination.paginate(
+                self.connection.conversation,
+                cursor,
+                page_size=2,
+            )
+            seen.extend(page.object_list)
+
+            if not page.has_older:
+                break
+
+            cursor = page.older_cursor
+
+        self.assertEqual(seen, self.messages[::-1])
+
+    def test_since_merges_both_directions_oldest_first(self):
+        page = pagination.since(
+            self.connection.conversation,
+            pagination.cursor_for(self.messages[1]),
+            page_size=10,
+        )
+
+        self.assertEqual(page.object_list, self.messages[2:])
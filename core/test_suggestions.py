@@ -0,0 +1,115 @@
+import io
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from . import models, suggestions
+
+class IntroSuggestionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.users = {
+            username: models.User.objects.create(username=username)
+            for username in ('user', 'alice', 'bob', 'carol', 'dave')
+        }
+
+        # alice and bob know user and dave; carol only knows user
+        self.connect('user', 'alice')
+        self.connect('user', 'bob')
+        self.connect('user', 'carol')
+        self.connect('alice', 'dave')
+        self.connect('bob', 'dave')
+
+    def connect(self, owner, other_user):
+        models.Connection.objects.create(
+            owner=self.users[owner],
+            other_user=self.users[other_user],
+        )
+
+    def suggested_pairs(self, username):
+        return [
+            (
+                models.User.objects.get(pk=receiver_pk).username,
+                models.User.objects.get(pk=introduced_pk).username,
+                mutual_count,
+            )
+            for receiver_pk, introduced_pk, mutual_count
+            in suggestions.suggest_intros(self.users[username].pk)
+        ]
+
+    def test_ranked_by_mutual_connections(self):
+        pairs = self.suggested_pairs('user')
+
+        self.assertEqual(len(pairs), 3)
+        self.assertEqual(set(pairs[0][:2]), {'alice', 'bob'})
+        self.assertEqual(pairs[0][2], 1)
+        self.assertEqual([pair[2] for pair in pairs[1:]], [0, 0])
+
+    def test_mutual_count_leaves_out_user(self):
+        # dave is the only connection alice and bob have in common besides
+        # user, who is introducing them
+        pairs = {
+            frozenset(pair[:2]): pair[2]
+            for pair in self.suggested_pairs('user')
+        }
+
+        self.assertEqual(pairs[frozenset(('alice', 'bob'))], 1)
+
+    def test_connected_pairs_are_not_suggested(self):
+        self.connect('alice', 'bob')
+
+        pairs = self.suggested_pairs('user')
+
+        self.assertNotIn({'alice', 'bob'}, [set(p[:2]) for p in pairs])
+
+    def test_introduced_pairs_are_not_suggested(self):
+        models.Intro.objects.create(
+            sender=self.users['user'],
+            receiver=self.users['alice'],
+            introduced=self.users['bob'],
+        )
+
+        pairs = self.suggested_pairs('user')
+
+        self.assertNotIn({'alice', 'bob'}, [set(p[:2]) for p in pairs])
+
+    def test_command_stores_suggestions(self):
+        call_command('suggest_intros', 'user', limit=1, stdout=io.StringIO())
+
+        stored = self.users['user'].intro_suggestions.get()
+        self.assertEqual(
+            {stored.receiver.username, stored.introduced.username},
+            {'alice', 'bob'},
+        )
+        self.assertEqual(stored.mutual_count, 1)
+
+    def test_intro_list_shows_current_suggestions(self):
+        suggestions.materialize(self.users['user'].pk)
+        self.connect('alice', 'carol')
+        self.client.force_login(self.users['user'])
+
+        response = self.client.get(reverse('intro_list'))
+
+        self.assertEqual(
+            [
+                {s.receiver.username, s.introduced.username}
+                for s in response.context['suggestions']
+            ],
+            [{'alice', 'bob'}, {'bob', 'carol'}],
+        )
+
+    def test_sending_intro_removes_suggestion(self):
+        suggestions.materialize(self.users['user'].pk)
+
+        models.Intro.objects.create(
+            sender=self.users['user'],
+            receiver=self.users['bob'],
+            introduced=self.users['alice'],
+        )
+
+        self.assertFalse(self.users['user'].intro_suggestions.filter(
+            receiver__in=(self.users['alice'], self.users['bob']),
+            introduced__in=(self.users['alice'], self.users['bob']),
+        ).exists())
@@ -0,0 +1,101 @@
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase
+
+from . import models, uuids
+
+def clock_at(milliseconds):
+    return mock.patch('time.time_ns', return_value=milliseconds * 1_000_000)
+
+class UUID7Tests(SimpleTestCase):
+    def setUp(self):
+        # Forget the UUIDs made before the clock was mocked
+        patcher = mock.patch.multiple(
+            uuids,
+            _last_milliseconds=0,
+            _last_random=0,
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_version_and_variant(self):
+        value = uuids.uuid7()
+
+        self.assertEqual(value.version, 7)
+        self.assertEqual(value.variant, 'specified in RFC 4122')
+
+    def test_starts_with_timestamp(self):
+        with clock_at(1_700_000_000_123):
+            value = uuids.uuid7()
+
+        self.assertEqual(
+            uuids.timestamp_milliseconds(value),
+            1_700_000_000_123,
+        )
+
+    def test_later_uuids_sort_after_earlier_ones(self):
+        with clock_at(1_700_000_000_000):
+            earlier = uuids.uuid7()
+
+        with clock_at(1_700_000_000_001):
+            later = uuids.uuid7()
+
+        self.assertLess(earlier, later)
+
+    def test_increasing_within_a_millisecond(self):
+        with clock_at(1_800_000_000_000):
+            values = [uuids.uuid7() for _ in range(1000)]
+
+        self.assertEqual(values, sorted(set(values)))
+        self.assertEqual(
+            {uuids.timestamp_milliseconds(value) for value in values},
+            {1_800_000_000_000},
+        )
+
+    def test_increasing_if_clock_goes_backwards(self):
+        with clock_at(1_900_000_000_000):
+            earlier = uuids.uuid7()
+
+        with clock_at(1_899_000_000_000):
+            later = uuids.uuid7()
+
+        self.assertLess(earlier, later)
+        self.assertEqual(later.version, 7)
+
+class PrimaryKeyTests(TestCase):
+    def setUp(self):
+        self.owner = models.User.objects.create(username='owner')
+        self.reader = models.User.objects.create(username='reader')
+        self.connection = models.Connection.objects.create(
+            owner=self.owner,
+            other_user=self.reader,
+        )
+
+    def test_internal_rows_get_time_ordered_keys(self):
+        messages = [
+            self.owner.send_message_to(
+                self.reader,
+                text='Message {}'.format(i),
+            )
+            for i in range(3)
+        ]
+
+        self.assertEqual(messages[0].pk.version, 7)
+        self.assertEqual(
+            list(self.connection.outgoing_messages.order_by('pk')),
+            messages,
+        )
+
+    def test_rows_in_urls_keep_random_keys(self):
+        # Their keys would otherwise reveal when they were made
+        post = models.Post.objects.create(owner=self.owner, text='Hello')
+        invitation = models.Invitation.objects.create(owner=self.owner)
+
+        for row in (
+            self.owner,
+            self.connection,
+            self.owner.circles.first(),
+            post,
+            invitation,
+        ):
+            self.assertEqual(row.pk.version, 4)
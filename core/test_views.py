@@ -1,7 +1,23 @@
-from django.test import Client, TestCase
+from concurrent.futures import ThreadPoolExecutor
+import io
+import shutil
+import tempfile
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from PIL import Image
 
-from . import models, views
+from . import (
+    avatars,
+    context_processors,
+    models,
+    pagination,
+    stylesheets,
+    views,
+)
 
 class InvitationViewTests(TestCase):
     def setUp(self):
@@ -17,3 +33,490 @@ class InvitationViewTests(TestCase):
         self.client0.login(username='test0', password='password0')
         self.client1 = Client()
         self.client1.login(username='test1', password='password1')
+
+class ConvoListViewTests(TestCase):
+    def setUp(self):
+        self.user = models.User.objects.create_user(
+            username='test0',
+            password='password0',
+        )
+        self.client.force_login(self.user)
+
+    def add_conversation(self, username, text):
+        other_user = models.User.objects.create(username=username)
+        models.Connection.objects.create(
+            owner=self.user,
+            other_user=other_user,
+        )
+        return other_user.send_message_to(self.user, text=text)
+
+    def count_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('convo_list'))
+
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_conversations(self):
+        # Before Connection.last_message, 150 conversations took 457 queries
+        self.add_conversation('other0', 'Hello')
+        few_conversations = self.count_queries()
+
+        for i in range(1, 150):
+            self.add_conversation(f'other{i}', 'Hello')
+        many_conversations = self.count_queries()
+
+        self.assertEqual(few_conversations, many_conversations)
+
+    def test_conversations_ordered_by_latest_message(self):
+        self.add_conversation('older', 'First')
+        self.add_conversation('newer', 'Second')
+
+        response = self.client.get(reverse('convo_list'))
+
+        self.assertEqual(
+            [c.other_user.username for c in response.context['object_list']],
+            ['newer', 'older'],
+        )
+        self.assertContains(response, 'Second')
+
+@override_settings(MESSAGE_PAGE_SIZE=2)
+class ConvoDetailViewTests(TestCase):
+    def setUp(self):
+        self.user = models.User.objects.create_user(
+            username='test0',
+            password='password0',
+        )
+        self.other_user = models.User.objects.create(username='test1')
+        models.Connection.objects.create(
+            owner=self.user,
+            other_user=self.other_user,
+        )
+        self.messages = [
+            self.other_user.send_message_to(self.user, text=f'Message {i}')
+            for i in range(3)
+        ]
+        self.client.force_login(self.user)
+
+    def test_shows_latest_messages_oldest_first(self):
+        response = self.client.get(
+            reverse('convo_detail', args=[self.other_user.pk]),
+        )
+
+        self.assertEqual(
+            list(response.context['object_list']),
+            self.messages[1:],
+        )
+        self.assertContains(response, '?before=')
+
+    def test_older_page(self):
+        response = self.client.get(
+            reverse('convo_detail', args=[self.other_user.pk]),
+        )
+        response = self.client.get(
+            reverse('convo_detail', args=[self.other_user.pk]),
+            { 'before': response.context['page'].older_cursor },
+        )
+
+        self.assertEqual(
+            list(response.context['object_list']),
+            self.messages[:1],
+        )
+        # Polling would append newer messages below the older ones
+        self.assertNotContains(response, 'data-since-url')
+
+    def test_marks_only_shown_messages_read(self):
+        response = self.client.get(
+            reverse('convo_detail', args=[self.other_user.pk]),
+        )
+
+        self.assertContains(response, 'data-since-url')
+        self.assertEqual(self.user.unread_message_count, 1)
+        self.assertFalse(
+            models.Message.objects.get(pk=self.messages[0].pk).is_read,
+        )
+
+    def test_since_returns_only_newer_messages(self):
+        cursor = pagination.cursor_for(self.messages[1])
+
+        response = self.client.get(
+            reverse('convo_since', args=[self.other_user.pk, cursor]),
+        )
+        data = response.json()
+
+        self.assertEqual(
+            [m['text'] for m in data['messages']],
+            ['Message 2'],
+        )
+        self.assertIn('Message 2', data['html'])
+
+        response = self.client.get(data['since_url'])
+
+        self.assertEqual(response.json()['messages'], [])
+
+    def test_since_marks_new_messages_read(self):
+        response = self.client.get(
+            reverse(
+                'convo_since',
+                args=[self.other_user.pk, pagination.START_CURSOR],
+            ),
+        )
+
+        self.assertEqual(len(response.json()['messages']), 2)
+        self.assertEqual(self.user.unread_message_count, 1)
+
+    def test_since_requires_connection(self):
+        stranger = models.User.objects.create(username='test2')
+
+        response = self.client.get(
+            reverse(
+                'convo_since',
+                args=[stranger.pk, pagination.START_CURSOR],
+            ),
+        )
+
+        self.assertEqual(response.status_code, 404)
+
+class NavigationTests(TestCase):
+    def setUp(self):
+        self.user = models.User.objects.create_user(
+            username='test0',
+            password='password0',
+        )
+        other_user = models.User.objects.create(username='test1')
+        models.Connection.objects.create(
+            owner=self.user,
+            other_user=other_user,
+        )
+        other_user.send_message_to(self.user, text='Hello')
+
+        # As loaded by a request, with its maintained connection_count
+        self.user.refresh_from_db()
+
+    def test_counts_take_one_query(self):
+        navigation = context_processors.Navigation(self.user)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(navigation.connection_count, 1)
+            self.assertEqual(navigation.open_intro_count, 0)
+            self.assertEqual(navigation.unread_message_count, 1)
+
+    def test_navigation_is_computed_once_per_request(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('index'))
+
+        self.assertIs(
+            response.context['navigation'],
+            response.wsgi_request._navigation,
+        )
+        self.assertContains(response, 'messages (1)')
+
+class StylesheetTests(TestCase):
+    def setUp(self):
+        stylesheets.render_stylesheet.cache_clear()
+        self.user = models.User.objects.create_user(
+            username='test0',
+            password='password0',
+            foreground_color='#123456',
+        )
+        self.client.force_login(self.user)
+
+    def get_stylesheet_url(self):
+        response = self.client.get(reverse('index'))
+        return reverse(
+            'css_style_versioned',
+            kwargs={ 'digest': response.context['stylesheet'].digest },
+        )
+
+    def test_stylesheet_rendered_once_per_colors(self):
+        url = self.get_stylesheet_url()
+        self.client.get(url)
+        self.client.get(url)
+
+        self.assertEqual(stylesheets.render_stylesheet.cache_info().misses, 1)
+
+    def test_stylesheet_uses_user_colors(self):
+        response = self.client.get(self.get_stylesheet_url())
+
+        self.assertContains(response, '--fg: #123456;')
+        self.assertEqual(response['Content-Type'], 'text/css')
+
+    def test_versioned_stylesheet_is_cached_forever(self):
+        response = self.client.get(self.get_stylesheet_url())
+
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('max-age=31536000', response['Cache-Control'])
+
+    def test_matching_etag_is_not_modified(self):
+        url = self.get_stylesheet_url()
+        etag = self.client.get(url)['ETag']
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+    def test_stale_digest_redirects(self):
+        url = self.get_stylesheet_url()
+
+        self.user.foreground_color = '#654321'
+        self.user.save()
+
+        response = self.client.get(url)
+
+        self.assertRedirects(response, self.get_stylesheet_url())
+
+class ProfileEditViewTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+
+        self.user = models.User.objects.create_user(
+            username='test0',
+            password='password0',
+        )
+        self.client.force_login(self.user)
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root)
+
+    def upload_avatar(self):
+        buffer = io.BytesIO()
+        Image.new('RGB', (30, 20), 'red').save(buffer, format='PNG')
+
+        return self.client.post(reverse('profile_edit'), {
+            'name': 'Test',
+            'avatar': SimpleUploadedFile('a.png', buffer.getvalue()),
+        })
+
+    def test_avatar_processed_during_request_by_default(self):
+        self.upload_avatar()
+
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.avatar_pending)
+        self.assertTrue(self.user.avatar_thumbnail_stem)
+
+    @override_settings(DEFER_AVATAR_PROCESSING=True)
+    def test_deferred_avatar_shows_placeholder_until_processed(self):
+        self.upload_avatar()
+
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.avatar_pending)
+        self.assertEqual(self.user.avatar_thumbnail_stem, '')
+
+        response = self.client.get(reverse('profile_edit'))
+        self.assertContains(response, 'Your avatar is being processed')
+
+        # Not a process pool, see AvatarProcessingTests.run_pending
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            avatars.run_pending(executor=executor)
+
+        response = self.client.get(reverse('profile_edit'))
+        self.assertNotContains(response, 'Your avatar is being processed')
+        self.assertContains(response, 'Avatar preview')
+
+    def test_changing_crop_only_regenerates_thumbnails(self):
+        self.upload_avatar()
+        self.user.refresh_from_db()
+        avatar_name = self.user.avatar.name
+        centered_stem = self.user.avatar_thumbnail_stem
+
+        self.client.post(reverse('profile_edit'), {
+            'name': 'Test',
+            'avatar_crop_x0': 10,
+            'avatar_crop_x1': 30,
+            'avatar_crop_y0': 0,
+            'avatar_crop_y1': 20,
+        })
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.avatar.name, avatar_name)
+        self.assertNotEqual(self.user.avatar_thumbnail_stem, centered_stem)
+
+    @override_settings(DEFER_AVATAR_PROCESSING=True)
+    def test_deferred_crop_change_regenerates_thumbnails_later(self):
+        with override_settings(DEFER_AVATAR_PROCESSING=False):
+            self.upload_avatar()
+
+        self.user.refresh_from_db()
+        centered_stem = self.user.avatar_thumbnail_stem
+
+        self.client.post(reverse('profile_edit'), {
+            'name': 'Test',
+            'avatar_crop_x0': 10,
+            'avatar_crop_x1': 30,
+            'avatar_crop_y0': 0,
+            'avatar_crop_y1': 20,
+        })
+
+        # Cropped in CSS until the thumbnails are regenerated
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.avatar_thumbnail_stem, '')
+        self.assertContains(
+            self.client.get(reverse('profile_edit')),
+            'Avatar preview',
+        )
+
+        self.assertEqual(avatars.run_pending(), (1, 0))
+
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.avatar_thumbnail_stem)
+        self.assertNotEqual(self.user.avatar_thumbnail_stem, centered_stem)
+
+class FeedQueryCountTests(TestCase):
+    def setUp(self):
+        self.user = models.User.objects.create_user(
+            username='test0',
+            password='password0',
+        )
+        self.client.force_login(self.user)
+
+    def add_friend_post(self, username):
+        friend = models.User.objects.create(username=username)
+        invitation = friend.create_invitation(
+            circles=friend.circles.filter(name='Friends'),
+        )
+        self.user.accept_invitation(
+            invitation,
+            circles=self.user.circles.filter(name='Friends'),
+        )
+
+        post = models.Post.objects.create(owner=friend, text='Hello')
+        post.publish(circles=friend.circles.filter(name='Friends'))
+        return friend
+
+    def count_queries(self, url):
+        # Warm the connection cache, so both counts are taken with it warm
+        self.client.get(url)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_index_query_count_does_not_grow_with_posts(self):
+        self.add_friend_post('friend0')
+        few_posts = self.count_queries(reverse('index'))
+
+        for i in range(1, 15):
+            self.add_friend_post(f'friend{i}')
+        many_posts = self.count_queries(reverse('index'))
+
+        self.assertEqual(few_posts, many_posts)
+
+    def test_user_detail_query_count_does_not_grow_with_posts(self):
+        friend = self.add_friend_post('friend')
+        url = reverse('user_detail', kwargs={ 'pk': friend.pk })
+        few_posts = self.count_queries(url)
+
+        for _ in range(15):
+            post = models.Post.objects.create(owner=friend, text='Hello')
+            post.publish(circles=friend.circles.filter(name='Friends'))
+        many_posts = self.count_queries(url)
+
+        self.assertEqual(few_posts, many_posts)
+
+    def test_own_user_detail_query_count_does_not_grow_with_posts(self):
+        url = reverse('profile_detail')
+        models.Post.objects.create(owner=self.user, text='Hello')
+        few_posts = self.count_queries(url)
+
+        for _ in range(15):
+            models.Post.objects.create(owner=self.user, text='Hello')
+        many_posts = self.count_queries(url)
+
+        self.assertEqual(few_posts, many_posts)
+
+class ConnectionBulkUpdateTests(TestCase):
+    def setUp(self):
+        self.user = models.User.objects.create_user(
+            username='test0',
+            password='password0',
+        )
+        self.client.force_login(self.user)
+        self.family = self.user.circles.get(name='Family')
+        self.friends = self.user.circles.get(name='Friends')
+
+    def add_connections(self, count):
+        for i in range(count):
+            other_user = models.User.objects.create(
+                username=f'other{models.User.objects.count()}',
+            )
+            models.Connection.objects.create(
+                owner=self.user,
+                other_user=other_user,
+            )
+
+    def post_selections(self, pairs):
+        data = {
+            f'selection:{circle.pk}/{other_user_pk}': 'on'
+            for circle, other_user_pk in pairs
+        }
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('connection_bulk_edit'), data)
+
+        # Count now: the query log is capped, so later queries shift it
+        query_count = len(queries)
+
+        self.assertRedirects(response, reverse('connection_list'))
+        return query_count
+
+    def memberships(self):
+        return set(models.CircleMembership.objects.filter(
+            connection__owner=self.user,
+        ).values_list('circle', 'connection__other_user'))
+
+    def test_adds_and_removes_memberships(self):
+        self.add_connections(2)
+        first, second = self.user.connections.values_list(
+            'other_user',
+            flat=True,
+        )
+        self.post_selections([
+            (self.family, first),
+            (self.friends, second),
+        ])
+
+        self.post_selections([
+            (self.family, first),
+            (self.family, second),
+        ])
+
+        self.assertEqual(self.memberships(), {
+            (self.family.pk, first),
+            (self.family.pk, second),
+        })
+
+    def test_statement_count_is_bounded(self):
+        def swap_all_circles():
+            other_user_pks = self.user.connections.values_list(
+                'other_user',
+                flat=True,
+            )
+            # Move everyone from whichever circle they are in to the other
+            current = self.memberships()
+            return self.post_selections([
+                (
+                    self.friends
+                    if (self.family.pk, pk) in current
+                    else self.family,
+                    pk,
+                )
+                for pk in other_user_pks
+            ])
+
+        self.add_connections(5)
+        swap_all_circles()
+        few_connections = swap_all_circles()
+
+        self.add_connections(145)
+        swap_all_circles()
+        many_connections = swap_all_circles()
+
+        # This took 1355 statements before the diff was done with sets. The
+        # one extra statement is because Django deletes 100 rows at a time.
+        self.assertEqual(many_connections, few_connections + 1)
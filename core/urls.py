@@ -23,6 +23,11 @@ connection_urlpatterns = [
 convo_urlpatterns = [
     path('<uuid:pk>', views.convo_detail, name='convo_detail'),
     path('<uuid:pk>/new', views.message_create, name='message_create'),
+    path(
+        '<uuid:pk>/since/<str:cursor>',
+        views.convo_since,
+        name='convo_since',
+    ),
 ]
 
 intro_urlpatterns = [
@@ -60,6 +65,13 @@ urlpatterns = [
     path('convos/', include(convo_urlpatterns)),
 
     path('style.css', views.css_style, name='css_style'),
+    path(
+        'style.<str:digest>.css',
+        views.css_style,
+        name='css_style_versioned',
+    ),
+
+    path('feed', views.index_feed, name='index_feed'),
 
     path('posts/', include(post_urlpatterns)),
 
@@ -74,7 +86,9 @@ urlpatterns = [
 
     path('users/me/edit', views.profile_edit, name='profile_edit'),
     path('users/me', views.user_detail, name='profile_detail'),
+    path('users/me/feed', views.user_feed, name='profile_feed'),
     path('users/<uuid:pk>', views.user_detail, name='user_detail'),
+    path('users/<uuid:pk>/feed', views.user_feed, name='user_feed'),
     path(
         'users/<uuid:pk>/circles/edit',
         views.edit_connection_circles,
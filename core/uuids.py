@@ -0,0 +1,68 @@
+'''
+Time-ordered UUIDs for primary keys, laid out as UUID version 7 (RFC 9562):
+a 48-bit Unix timestamp in milliseconds, the version and variant bits, and
+74 random bits.
+
+Random (version 4) keys land all over the primary key index, so every
+insert touches a different page. Keys which start with the time they were
+made are inserted at the end of the index, next to the rows inserted just
+before them, and sorting by primary key sorts by creation time to the
+millisecond.
+
+That also means a key reveals when its row was made, so these are only
+used for tables whose keys don't appear in URLs, like messages, circle
+memberships and jobs. Users, posts, circles, connections, intros and
+invitations keep random keys.
+'''
+import secrets
+import threading
+import time
+import uuid
+
+_RANDOM_BITS = 74
+_RAND_B_BITS = 62
+
+_lock = threading.Lock()
+_last_milliseconds = 0
+_last_random = 0
+
+def uuid7():
+    '''
+    Returns a new version 7 UUID. UUIDs made by one process are strictly
+    increasing, even within a millisecond or if the clock goes backwards:
+    the random part then continues from the last UUID's, plus a random
+    step so the next key still can't be guessed from the previous one.
+    '''
+    global _last_milliseconds, _last_random
+
+    milliseconds = time.time_ns() // 1_000_000
+    random = secrets.randbits(_RANDOM_BITS)
+
+    with _lock:
+        if milliseconds <= _last_milliseconds:
+            milliseconds = _last_milliseconds
+            random = _last_random + 1 + secrets.randbits(32)
+
+            if random >> _RANDOM_BITS:
+                milliseconds += 1
+                random &= (1 << _RANDOM_BITS) - 1
+
+        _last_milliseconds = milliseconds
+        _last_random = random
+
+    rand_a = random >> _RAND_B_BITS
+    rand_b = random & ((1 << _RAND_B_BITS) - 1)
+
+    value = milliseconds << 80
+    value |= 0x7 << 76  # version
+    value |= rand_a << 64
+    value |= 0b10 << 62  # variant
+    value |= rand_b
+
+    return uuid.UUID(int=value)
+
+def timestamp_milliseconds(value):
+    '''
+    The Unix time in milliseconds a version 7 UUID was made at.
+    '''
+    return value.int >> 80
@@ -1,10 +1,14 @@
 import io
 import uuid
 
+from django.conf import settings as django_settings
 from django.contrib.auth import authenticate, login
-from django.db.models import Count, Q
+from django.contrib.auth.mixins import LoginRequiredMixin
+from django.http import Http404, HttpResponse, JsonResponse
 from django.shortcuts import get_object_or_404, redirect
+from django.template.loader import render_to_string
 from django.urls import reverse, reverse_lazy
+from django.utils.cache import get_conditional_response, patch_cache_control
 from django.utils.safestring import mark_safe
 from django.views import View
 from django.views.generic import CreateView, DeleteView, UpdateView
@@ -16,7 +20,14 @@ from django.utils import timezone
 
 import pyqrcode
 
-from . import forms, models
+from . import (
+    forms,
+    memberships,
+    models,
+    pagination,
+    stylesheets,
+    suggestions,
+)
 
 class AboutView(TemplateView):
     template_name = 'core/about.html'
@@ -95,6 +106,14 @@ class CircleDetailView(DetailView):
             pk=self.kwargs['pk'],
         )
 
+    def get_context_data(self, *args, **kwargs):
+        result = super().get_context_data(*args, **kwargs)
+        result['feed_page'] = pagination.paginate(
+            self.object.posts,
+            self.request.GET.get('before'),
+        )
+        return result
+
 circle_detail = CircleDetailView.as_view()
 
 class CircleListView(ListView):
@@ -107,13 +126,14 @@ circle_list = CircleListView.as_view()
 
 class ConnectionBulkUpdate(View):
     def post(self, request, *args, **kwargs):
-        circles_by_pk = {
-            str(circle.pk): circle
-            for circle in request.user.circles.all()
+        circle_pks = {
+            str(circle_pk): circle_pk
+            for circle_pk in request.user.circles.values_list('pk', flat=True)
         }
-        connections_by_other_user_pk = {
-            str(conn.other_user.pk): conn
-            for conn in request.user.connections.all()
+        connection_pks_by_other_user_pk = {
+            str(other_user_pk): connection_pk
+            for other_user_pk, connection_pk
+            in request.user.connections.values_list('other_user', 'pk')
         }
 
         selections = [
@@ -125,31 +145,21 @@ class ConnectionBulkUpdate(View):
         # Note that the dictionaries only contain Circles/Connections owned
         # by the request.user, so KeyErrors here might mean request.user
         # is trying to modify CircleMemberships that don't belong to them
-        selected_circle_memberships = [
+        selected = {
             (
-                circles_by_pk[circle_pk],
-                connections_by_other_user_pk[conn_other_user_pk],
+                circle_pks[circle_pk],
+                connection_pks_by_other_user_pk[conn_other_user_pk],
             )
             for circle_pk, conn_other_user_pk in selections
-        ]
+        }
 
-        existing_circle_memberships = models.CircleMembership.objects.filter(
-            connection__owner=request.user,
+        memberships.update(
+            models.CircleMembership.objects.filter(
+                connection__owner=request.user,
+            ),
+            selected,
         )
 
-        # Delete existing CircleMemberships that aren't selected
-        for existing_cm in existing_circle_memberships:
-            ecm_as_tuple = (existing_cm.circle, existing_cm.connection)
-            if ecm_as_tuple not in selected_circle_memberships:
-                existing_cm.delete()
-
-        # Add selected CircleMemberships that don't already exist
-        for circle, conn in selected_circle_memberships:
-            models.CircleMembership.objects.get_or_create(
-                circle=circle,
-                connection=conn,
-            )
-
         return redirect(reverse('connection_list'))
 
 conn_bulk_edit = ConnectionBulkUpdate.as_view()
@@ -181,34 +191,100 @@ connection_list = ConnectionListView.as_view()
 
 class ConvoDetail(ListView):
     model = models.Message
+    template_name = 'core/message_list.html'
 
     def get_queryset(self):
-        other_user = get_object_or_404(
-            models.User,
-            pk=self.kwargs['pk'],
+        self.connection = get_object_or_404(
+            self.request.user.connections.select_related('other_user'),
+            other_user__pk=self.kwargs['pk'],
+        )
+        self.page = pagination.paginate(
+            self.connection.conversation,
+            self.request.GET.get('before'),
+            page_size=django_settings.MESSAGE_PAGE_SIZE,
         )
-        connection = self.request.user.connections.get(other_user=other_user)
-        return models.Message.objects.filter(
-            Q(connection=connection) | Q(connection=connection.opposite)
-        ).order_by('created_utc')
+
+        # Messages on newer pages haven't been seen yet
+        self.connection.mark_read(self.page.object_list)
+
+        # Pages are newest first, but conversations read oldest first
+        return list(reversed(self.page.object_list))
 
     def get_context_data(self, *args, **kwargs):
         result = super().get_context_data(*args, **kwargs)
         result['form'] = forms.MessageForm()
-        result['other_user'] = models.User.objects.get(pk=self.kwargs['pk'])
+        result['connection'] = self.connection
+        result['other_user'] = self.connection.other_user
+        result['page'] = self.page
+
+        # Only the newest page polls, since new messages belong at its end
+        if not self.request.GET.get('before'):
+            cursor = self.page.newer_cursor or pagination.START_CURSOR
+            result['since_url'] = reverse(
+                'convo_since',
+                kwargs={'pk': self.kwargs['pk'], 'cursor': cursor},
+            )
+
         return result
 
 convo_detail = ConvoDetail.as_view()
 
+class ConvoSince(LoginRequiredMixin, View):
+    '''
+    Returns messages newer than the cursor, for script.js to poll and append
+    to the conversation without reloading the page.
+    '''
+    def get(self, request, *args, **kwargs):
+        connection = get_object_or_404(
+            request.user.connections,
+            other_user__pk=kwargs['pk'],
+        )
+
+        page = pagination.since(
+            connection.conversation,
+            kwargs['cursor'],
+            page_size=django_settings.MESSAGE_PAGE_SIZE,
+        )
+
+        connection.mark_read(page.object_list)
+
+        return JsonResponse({
+            'messages': [
+                {
+                    'id': str(message.pk),
+                    'created_utc': message.created_utc.isoformat(),
+                    'is_outgoing': message.connection_id == connection.pk,
+                    'text': message.text,
+                }
+                for message in page.object_list
+            ],
+            'html': render_to_string(
+                'widgets/messages.html',
+                {
+                    'connection': connection,
+                    'message_list': page.object_list,
+                },
+                request=request,
+            ),
+            'since_url': reverse(
+                'convo_since',
+                kwargs={ 'pk': kwargs['pk'], 'cursor': page.newer_cursor },
+            ),
+        })
+
+convo_since = ConvoSince.as_view()
+
 class ConvoList(ListView):
     model = models.Connection
     template_name = 'core/convo_list.html'
 
     def get_queryset(self):
-        return self.request.user.connections.annotate(
-            outgoing_count=Count('outgoing_messages'),
-            incoming_count=Count('opposite__outgoing_messages'),
-        ).filter(Q(outgoing_count__gt=0) | Q(incoming_count__gt=0))
+        return self.request.user.connections.filter(
+            message_count__gt=0,
+        ).select_related(
+            'other_user',
+            'last_message',
+        ).order_by('-last_message__created_utc')
 
 convo_list = ConvoList.as_view()
 
@@ -228,9 +304,45 @@ class MessageCreateView(CreateView):
 
 message_create = MessageCreateView.as_view()
 
-class CSSView(TemplateView):
-    template_name = 'core/style.css'
-    content_type = 'text/css'
+class CSSView(View):
+    '''
+    Serves the stylesheet for the request's user. base.html links to it by
+    the digest of its content, so that URL can be cached forever; if the
+    digest is stale (e.g. the user changed their colors) we redirect to the
+    current one.
+    '''
+    MAX_AGE = 60 * 60 * 24 * 365
+
+    def get(self, request, *args, **kwargs):
+        stylesheet = stylesheets.stylesheet_for(request.user)
+        digest = kwargs.get('digest')
+
+        if digest is not None and digest != stylesheet.digest:
+            response = redirect(
+                'css_style_versioned',
+                digest=stylesheet.digest,
+            )
+            patch_cache_control(response, no_cache=True)
+            return response
+
+        response = HttpResponse(stylesheet.css, content_type='text/css')
+        response['ETag'] = '"{}"'.format(stylesheet.digest)
+
+        if digest is None:
+            patch_cache_control(response, no_cache=True)
+        else:
+            patch_cache_control(
+                response,
+                private=True,
+                max_age=self.MAX_AGE,
+                immutable=True,
+            )
+
+        return get_conditional_response(
+            request,
+            etag=response['ETag'],
+            response=response,
+        )
 
 css_style = CSSView.as_view()
 
@@ -297,6 +409,9 @@ class IntroList(ListView):
         result['form'] = forms.IntroForm(
             connections=self.request.user.connected_users,
         )
+        result['suggestions'] = suggestions.current_suggestions(
+            self.request.user,
+        )
         return result
 
 intro_list = IntroList.as_view()
@@ -438,6 +553,29 @@ class ProfileEditView(UpdateView):
     def get_object(self):
         return self.request.user
 
+    def form_valid(self, form):
+        avatar_changed = 'avatar' in form.changed_data
+
+        if avatar_changed:
+            form.instance.avatar_pending = bool(form.instance.avatar)
+
+        result = super().form_valid(form)
+
+        if avatar_changed:
+            # Removing an avatar only deletes files, so it is never deferred
+            pending = self.object.avatar_pending
+
+            if not (pending and django_settings.DEFER_AVATAR_PROCESSING):
+                self.object.process_avatar()
+
+        elif set(form.CROP_FIELDS) & set(form.changed_data):
+            if django_settings.DEFER_AVATAR_PROCESSING:
+                self.object.discard_avatar_thumbnails()
+            else:
+                self.object.generate_avatar_thumbnails()
+
+        return result
+
 profile_edit = ProfileEditView.as_view()
 
 class ConnectedUserCircleEditView(UpdateView):
@@ -455,27 +593,22 @@ class ConnectedUserCircleEditView(UpdateView):
         )
 
     def form_valid(self, form):
-        target_user = self.object
-        connection = get_object_or_404(
-            self.request.user.connections,
-            other_user=target_user,
+        connection_pk = get_object_or_404(
+            self.request.user.connections.values_list('pk', flat=True),
+            other_user=self.object,
         )
 
-        selected_circles = form.cleaned_data['circles']
-
-        models.CircleMembership.objects.exclude(
-            circle__in=selected_circles,
-        ).filter(
-            connection=connection,
-        ).delete()
-
-        for circle in selected_circles:
-            models.CircleMembership.objects.get_or_create(
-                circle=circle,
-                connection=connection,
-            )
+        memberships.update(
+            models.CircleMembership.objects.filter(connection=connection_pk),
+            {
+                (circle.pk, connection_pk)
+                for circle in form.cleaned_data['circles']
+            },
+        )
 
-        return super().form_valid(form)
+        # The form has no fields of the user itself, so there is nothing
+        # to save
+        return redirect(self.get_success_url())
 
     def get_form_kwargs(self):
         kwargs = super().get_form_kwargs()
@@ -498,6 +631,55 @@ class DeleteDoneView(TemplateView):
 
 delete_done = DeleteDoneView.as_view()
 
+class FeedFragmentView(LoginRequiredMixin, View):
+    '''
+    Returns one page of a feed as rendered HTML, for script.js to append
+    to the page when the user clicks "older". This is the user's own feed;
+    subclasses override get_feed_queryset() for other feeds.
+    '''
+    created_field = 'feed_created_utc'
+
+    def get_feed_queryset(self):
+        return self.request.user.feed
+
+    def get_page(self):
+        return pagination.paginate(
+            self.get_feed_queryset(),
+            self.request.GET.get('before'),
+            created_field=self.created_field,
+        )
+
+    def get(self, request, *args, **kwargs):
+        page = self.get_page()
+
+        return JsonResponse({
+            'html': render_to_string(
+                'widgets/posts.html',
+                { 'post_list': page.object_list },
+                request=request,
+            ),
+            'older_cursor': page.older_cursor,
+        })
+
+index_feed = FeedFragmentView.as_view()
+
+class UserFeedFragmentView(FeedFragmentView):
+    created_field = 'created_utc'
+
+    def get_feed_queryset(self):
+        if 'pk' in self.kwargs:
+            user = get_object_or_404(
+                # Ensure that user is viewing a user they're connected with
+                self.request.user.connected_users,
+                pk=self.kwargs['pk'],
+            )
+        else:
+            user = self.request.user
+
+        return self.request.user.feed_for_user(user)
+
+user_feed = UserFeedFragmentView.as_view()
+
 class IndexView(TemplateView):
     template_name = 'core/index.html'
 
@@ -508,6 +690,11 @@ class IndexView(TemplateView):
             data['post_form'] = forms.PostForm(
                 circles=self.request.user.circles,
             )
+            data['feed_page'] = pagination.paginate(
+                self.request.user.feed,
+                self.request.GET.get('before'),
+                created_field='feed_created_utc',
+            )
 
         return data
 
@@ -656,8 +843,9 @@ class UserDetailView(DetailView):
                 connections__other_user=result['object']
             )
 
-        result['feed_for_user'] = self.request.user.feed_for_user(
-            result['object'],
+        result['feed_page'] = pagination.paginate(
+            self.request.user.feed_for_user(result['object']),
+            self.request.GET.get('before'),
         )
 
         return result